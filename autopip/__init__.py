@@ -1,10 +1,17 @@
 import argparse
 import logging
+import os
+from pathlib import Path
 import signal
 import sys
 
-from autopip.constants import UpdateFreq, INSTALL_TIMEOUT_MSG, WAIT_TIMEOUT_MSG, PYTHON_VERSION
+from autopip.backends import BACKENDS, BACKEND_ENV_VAR, DEFAULT_BACKEND
+from autopip.constants import (UpdateFreq, INSTALL_TIMEOUT_MSG, WAIT_TIMEOUT_MSG, PYTHON_VERSION,
+                               UPDATE_MAX_BUILDS_ENV_VAR, UPDATE_MAX_TIME_ENV_VAR)
 from autopip.manager import AppsManager
+from autopip.profiling import profile, profile_enabled, PROFILE_ENV_VAR
+from autopip.shims import LAUNCHERS
+from autopip.utils import format_spawn_summary, spawn_summary
 
 
 def main():
@@ -17,22 +24,11 @@ def main():
     signal.alarm(3600)
 
     try:
-        if args.command == 'install':
-            mgr.install(args.apps,
-                        update=UpdateFreq.from_name(args.update) if args.update else None,
-                        python_version=args.python)
-
-        elif args.command == 'list':
-            mgr.list(name_filter=args.name_filter, scripts=args.scripts)
-
-        elif args.command == 'update':
-            mgr.update(apps=args.apps, wait=args.wait)
-
-        elif args.command == 'uninstall':
-            mgr.uninstall(args.apps)
-
+        if profile_enabled(args.profile):
+            with profile(mgr.paths.log_root / 'profiles', args.command):
+                run_command(mgr, args)
         else:
-            raise NotImplementedError('Command {} not implemented yet'.format(args.command))
+            run_command(mgr, args)
 
     except KeyboardInterrupt:
         sys.exit(1)
@@ -42,38 +38,202 @@ def main():
             logging.error(f'! {e}', exc_info=args.debug)
         sys.exit(1)
 
+    finally:
+        if spawn_summary():
+            logging.debug('Processes started:\n%s', format_spawn_summary())
+
+
+def run_command(mgr, args):
+    """ Run the command from command-line args using the given :cls:`AppsManager` """
+    if args.command == 'install' and args.bundle:
+        mgr.install_bundle(Path(args.bundle).resolve(),
+                           update=UpdateFreq.from_name(args.update) if args.update else None,
+                           keep_versions=args.keep,
+                           activate_window=args.activate_window,
+                           launcher=args.launcher)
+
+    elif args.command == 'install':
+        mgr.install(args.apps,
+                    update=UpdateFreq.from_name(args.update) if args.update else None,
+                    python_version=args.python,
+                    keep_versions=args.keep,
+                    activate_window=args.activate_window,
+                    backend=args.backend,
+                    lock_file=args.lockfile and Path(args.lockfile).resolve(),
+                    launcher=args.launcher,
+                    base=args.base,
+                    adaptive_update=args.adaptive_update)
+
+    elif args.command == 'list':
+        mgr.list(name_filter=args.name_filter, scripts=args.scripts, output_format=args.format)
+
+    elif args.command == 'update' and args.plan:
+        mgr.plan(apps=args.apps, as_json=args.json)
+
+    elif args.command == 'update':
+        mgr.update(apps=args.apps, wait=args.wait, stage=args.stage, max_time=args.max_time,
+                   max_builds=args.max_builds)
+
+    elif args.command == 'apply':
+        mgr.apply(Path(args.file), prune=args.prune, jobs=args.jobs)
+
+    elif args.command == 'activate':
+        mgr.activate(apps=args.apps)
+
+    elif args.command == 'rollback':
+        mgr.rollback(args.app, version=args.version)
+
+    elif args.command == 'uninstall':
+        mgr.uninstall(args.apps)
+
+    elif args.command == 'dedupe':
+        mgr.dedupe(apps=args.apps)
+
+    elif args.command == 'doctor':
+        mgr.doctor(fix=args.fix)
+
+    elif args.command == 'base':
+        mgr.base(requirements=args.requirements, python_version=args.python, backend=args.backend)
+
+    elif args.command == 'bundle':
+        mgr.bundle(args.app, version=args.version, output=args.output and Path(args.output))
+
+    else:
+        raise NotImplementedError('Command {} not implemented yet'.format(args.command))
+
 
 def cli_args():
     """" Get command-line args """
     parser = argparse.ArgumentParser(description='Easily install apps from PyPI and '
                                                  'automatically keep them updated.')
     parser.add_argument('--debug', action='store_true', help='Turn on debug mode')
+    parser.add_argument('--profile', action='store_true',
+                        help='Record CPU profile and peak memory of the command to <log root>/profiles and show the '
+                             f'top hotspots. Also enabled by setting ${PROFILE_ENV_VAR}=1, such as for cron.')
     subparsers = parser.add_subparsers(title='Commands', help='List of commands', dest='command')
 
     install_parser = subparsers.add_parser('install',
                                            help='Install apps in their own virtual environments '
                                                 'that automatically updates')
-    install_parser.add_argument('apps', nargs='+', help='Apps to install')
+    install_parser.add_argument('apps', nargs='*', help='Apps to install')
     install_parser.add_argument('--update', choices=[m.name.lower() for m in UpdateFreq],
                                 help='How often to update the app via cron.')
     install_parser.add_argument('--python', metavar='VERSION', default=PYTHON_VERSION,
                                 help='Python version to run the app. [default: %(default)s]')
+    install_parser.add_argument('--keep', metavar='N', type=int,
+                                help='Number of versions to keep installed for rollback, including the current '
+                                     'version. [default: 2]')
+    install_parser.add_argument('--backend', choices=sorted(BACKENDS) + ['auto'],
+                                help='Installer backend to create virtual environment and install the app with. '
+                                     f'"auto" uses the fastest one available. [default: ${BACKEND_ENV_VAR} or '
+                                     f'{DEFAULT_BACKEND}]')
+    install_parser.add_argument('--lockfile', metavar='FILE',
+                                help='Install exact dependencies from a lock file saved by another install at '
+                                     '<install root>/<app>/.lockfiles/<version>.txt without resolving them.')
+    install_parser.add_argument('--activate-window', metavar='HH:MM-HH:MM',
+                                help='When to activate new versions staged by "update --stage" in local time, '
+                                     'or "manual" to only activate using activate command. [default: immediately]')
+    install_parser.add_argument('--launcher', choices=LAUNCHERS,
+                                help='How to launch scripts: "symlink" to scripts created by the installer, "shim" to '
+                                     'minimal launchers that import the entry point directly for faster startup, or '
+                                     '"isolated-shim" to also run Python in isolated mode (-I). [default: symlink]')
+    install_parser.add_argument('--base', action='store_const', const=True,
+                                help='Use common packages from the shared base layer of the Python version created by '
+                                     'base command instead of installing them in the app. Packages that the app needs '
+                                     'at other versions are still installed in the app.')
+    install_parser.add_argument('--no-base', action='store_const', const=False, dest='base',
+                                help='Install all packages in the app for apps previously installed with --base')
+    install_parser.add_argument('--adaptive-update', action='store_const', const=True,
+                                help='Check for new versions less often for apps that are rarely released, based on '
+                                     'when new versions were seen, and at the --update frequency again after a '
+                                     'release. Checks are at least monthly.')
+    install_parser.add_argument('--no-adaptive-update', action='store_const', const=False, dest='adaptive_update',
+                                help='Check for new versions at the --update frequency for apps previously installed '
+                                     'with --adaptive-update')
+    install_parser.add_argument('--bundle', metavar='FILE',
+                                help='Install the app from a bundle created by bundle command by extracting it '
+                                     'instead of building it. Apps should not be given.')
 
     list_parser = subparsers.add_parser('list', help='List installed apps')
     list_parser.add_argument('name_filter', nargs='?', help='Optionally filter by name')
     list_parser.add_argument('--scripts', action='store_true', help='Show scripts')
+    list_parser.add_argument('--format', choices=['table', 'json', 'jsonl'], default='table',
+                             help='Output format. JSON formats include all app info and are printed as each app is '
+                                  'read. [default: %(default)s]')
 
     update_parser = subparsers.add_parser('update', help='Update installed apps.')
     update_parser.add_argument('apps', nargs='*', help='Apps to update. Defaults to all apps if run interactively, '
                                                        'otherwise only auto-update enabled apps (e.g. from cron).')
     update_parser.add_argument('--wait', action='store_true', help='Wait for new version to be published '
                                                                    'and then install.')
+    update_parser.add_argument('--stage', action='store_true', help='Build new versions ahead of time with low '
+                                                                    'priority and activate them per the activation '
+                                                                    'window of each app.')
+
+    update_parser.add_argument('--max-time', metavar='SECONDS', type=int,
+                               default=os.environ.get(UPDATE_MAX_TIME_ENV_VAR),
+                               help='Stop updating more apps after this many seconds and defer the rest to the next '
+                                    'run. Most overdue apps are updated first. '
+                                    f'[default: ${UPDATE_MAX_TIME_ENV_VAR} or no limit]')
+    update_parser.add_argument('--max-builds', metavar='N', type=int,
+                               default=os.environ.get(UPDATE_MAX_BUILDS_ENV_VAR),
+                               help='Stop updating more apps after this many are updated and defer the rest to the '
+                                    f'next run. [default: ${UPDATE_MAX_BUILDS_ENV_VAR} or no limit]')
+    update_parser.add_argument('--plan', action='store_true', help='Show what the next update from cron would do, '
+                                                                   'without building or changing anything.')
+    update_parser.add_argument('--json', action='store_true', help='Show the plan as JSON')
+
+    apply_parser = subparsers.add_parser('apply', help='Install, upgrade or uninstall apps to match the desired state '
+                                                       'in a file. Apps that already match are left alone.')
+    apply_parser.add_argument('file', help='TOML or JSON file with list of apps, each with spec and optionally update '
+                                           'and python keys. E.g. {"apps": [{"spec": "bumper", "update": "daily"}]}')
+    apply_parser.add_argument('--prune', action='store_true', help='Uninstall apps that are not in the file')
+    apply_parser.add_argument('--jobs', type=int, default=4, help='Number of apps to change concurrently. '
+                                                                  '[default: %(default)s]')
+
+    activate_parser = subparsers.add_parser('activate', help='Activate versions staged by "update --stage" now')
+    activate_parser.add_argument('apps', nargs='*', help='Apps to activate. Defaults to all apps.')
+
+    rollback_parser = subparsers.add_parser('rollback', help='Switch an app back to a previously installed version')
+    rollback_parser.add_argument('app', help='App to rollback')
+    rollback_parser.add_argument('version', nargs='?', help='Version to switch to. Defaults to the previous version.')
 
     uninstall_parser = subparsers.add_parser('uninstall', help='Uninstall apps')
     uninstall_parser.add_argument('apps', nargs='+', help='Apps to uninstall')
 
+    dedupe_parser = subparsers.add_parser('dedupe', help='Hardlink identical files across installed apps to save '
+                                                         'disk space. This is also done after each install.')
+    dedupe_parser.add_argument('apps', nargs='*', help='Apps to dedupe. Defaults to all apps.')
+
+    doctor_parser = subparsers.add_parser('doctor', help='Check for missing, dangling or left over script symlinks')
+    doctor_parser.add_argument('--fix', action='store_true', help='Fix the issues found')
+
+    base_parser = subparsers.add_parser('base', help='Build or refresh the shared base layer of common packages that '
+                                                     'apps installed with --base use from their next install or '
+                                                     'update')
+    base_parser.add_argument('requirements', nargs='*', help='Packages of the layer, such as requests pyyaml. Defaults '
+                                                             'to packages of the current layer to refresh it with '
+                                                             'their latest versions.')
+    base_parser.add_argument('--python', metavar='VERSION', default=PYTHON_VERSION,
+                             help='Python version of the layer. [default: %(default)s]')
+    base_parser.add_argument('--backend', choices=sorted(BACKENDS) + ['auto'],
+                             help=f'Installer backend to build the layer with. [default: ${BACKEND_ENV_VAR} or '
+                                  f'{DEFAULT_BACKEND}]')
+
+    bundle_parser = subparsers.add_parser('bundle', help='Package an installed app into a tarball that can be '
+                                                         'installed on other hosts using "install --bundle" without '
+                                                         'building it again')
+    bundle_parser.add_argument('app', help='App to bundle')
+    bundle_parser.add_argument('version', nargs='?', help='Installed version to bundle. Defaults to the current '
+                                                          'version.')
+    bundle_parser.add_argument('--output', metavar='PATH', help='Bundle file or directory to create it in. '
+                                                                '[default: current directory]')
+
     args = parser.parse_args()
 
+    if args.command == 'install' and bool(args.apps) == bool(args.bundle):
+        install_parser.error('Please specify either apps or --bundle')
+
     if args.command:
         return args
 
@@ -0,0 +1,116 @@
+"""
+Python API to embed autopip in other programs, such as provisioning agents.
+
+Unlike the CLI, the API never exits the process. Each action returns :cls:`ActionResult` objects that describe what
+happened to each app, including any error. Progress is still logged via :mod:`logging`, so configure logging in the
+host program as needed.
+
+Example::
+
+    from autopip.api import Autopip
+
+    for result in Autopip().install(['bumper'], update='daily'):
+        if not result.ok:
+            print(f'{result.app} failed to install: {result.error}')
+"""
+from pathlib import Path
+
+from autopip.constants import UpdateFreq, PYTHON_VERSION
+from autopip.manager import App, AppsManager
+from autopip.results import ActionResult
+
+__all__ = ['ActionResult', 'Autopip']
+
+
+class Autopip:
+    """ Install, update, and uninstall apps, returning the results instead of logging and exiting on failures """
+
+    def __init__(self, debug=False):
+        """
+        :param bool debug: Log tracebacks of errors
+        """
+        self.manager = AppsManager(debug=debug)
+
+    def install(self, apps, update=None, python_version=PYTHON_VERSION, keep_versions=None, activate_window=None,
+                backend=None, lock_file=None, launcher=None, base=None, adaptive_update=None):
+        """
+        Install the given apps. New versions are checked for apps that are already installed.
+
+        :param list[str] apps: List of apps to install, such as ['bumper', 'developer-tools==1.*']
+        :param str|UpdateFreq update: How often to update the apps: hourly, daily, weekly, or monthly.
+        :param str python_version: Python version to run the apps
+        :param int keep_versions: Number of versions to keep installed for rollback
+        :param str activate_window: When to activate staged versions: HH:MM-HH:MM window or "manual"
+        :param str backend: Name of the installer backend to use for the apps
+        :param str|Path lock_file: Lock file from another install to install exact dependencies for apps pinned in it
+        :param str launcher: How to launch scripts of the apps: symlink, shim, or isolated-shim
+        :param bool base: Use common packages from the shared base layer of the Python version instead of installing
+                          them in each app
+        :param bool adaptive_update: Check for new versions less often for apps that are rarely released
+        :return: List of :cls:`ActionResult` for the apps
+        """
+        if isinstance(update, str):
+            update = UpdateFreq.from_name(update)
+
+        return self._run(apps, self.manager.install, list(apps), update=update, python_version=python_version,
+                         keep_versions=keep_versions, activate_window=activate_window, backend=backend,
+                         lock_file=lock_file and Path(lock_file).resolve(), force=True, raise_on_failure=False,
+                         launcher=launcher, base=base, adaptive_update=adaptive_update)
+
+    def update(self, apps=None, stage=False, force=True):
+        """
+        Update installed apps
+
+        :param list[str] apps: List of apps to update. Defaults to all.
+        :param bool stage: Build new versions ahead of time and activate them per their activation window.
+        :param bool force: Check for new versions even if the apps are not due for an update per their update
+                           frequency. Set to False to behave like an update from cron.
+        :return: List of :cls:`ActionResult` for the apps
+        """
+        return self._run(apps or [a.name for a in self.manager.apps], self.manager.update,
+                         apps=apps and list(apps), stage=stage, force=force, raise_on_failure=False)
+
+    def uninstall(self, apps):
+        """
+        Uninstall the given apps
+
+        :param list[str] apps: List of apps to uninstall
+        :return: List of :cls:`ActionResult` for the apps
+        """
+        return self._run(apps, self.manager.uninstall, list(apps))
+
+    def rollback(self, app, version=None):
+        """
+        Switch an app back to a previously installed version
+
+        :param str app: Name of the app
+        :param str version: Version to switch to. Defaults to the version before the current one.
+        :return: :cls:`ActionResult` for the app
+        """
+        return self._run([app], lambda: [self.manager.rollback(app, version=version)])[0]
+
+    def list(self, name_filter=None):
+        """
+        Installed apps
+
+        :param str name_filter: Only include apps with this in their names
+        :return: List of dicts with info about the installed apps, such as name, version, and scripts
+        """
+        return [app.info() for app in self.manager.apps if not name_filter or name_filter in app.name]
+
+    def app(self, name):
+        """ :cls:`App` with the given name that may or may not be installed """
+        return App(name, self.manager.paths, debug=self.manager.debug)
+
+    def _run(self, app_names, action, *args, **kwargs):
+        """ Run the action and return its results, or a failed result for each app if the action failed entirely """
+        try:
+            return action(*args, **kwargs)
+
+        except Exception as e:
+            results = []
+            for name in app_names:
+                result = ActionResult(name)
+                result.fail(e)
+                results.append(result)
+            return results
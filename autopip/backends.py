@@ -0,0 +1,199 @@
+import json
+from logging import debug
+import os
+import shutil
+from subprocess import STDOUT
+import sys
+import venv
+
+from autopip.exceptions import MissingError
+from autopip.utils import child_env, run
+
+#: Env var to select the installer backend for the host
+BACKEND_ENV_VAR = 'AUTOPIP_BACKEND'
+
+#: Default backend when none is selected
+DEFAULT_BACKEND = 'pip'
+
+# Python code to list installed distributions in a virtual environment that may not have pip installed
+_LIST_INSTALLED_PY = """
+import json
+try:
+    from importlib.metadata import distributions
+    dists = {d.metadata['Name']: d.version for d in distributions()}
+except ImportError:
+    import pkg_resources
+    dists = {d.project_name: d.version for d in pkg_resources.working_set}
+print(json.dumps(dists))
+"""
+
+
+class InstallerBackend:
+    """ Creates virtual environments and installs packages in them """
+
+    #: Name to select the backend with
+    name = None
+
+    @classmethod
+    def is_available(cls):
+        """ True if the backend can be used on this host """
+        return True
+
+    def create_env(self, path, python_version):
+        """
+        Create a virtual environment
+
+        :param Path path: Path to create the virtual environment in
+        :param str python_version: Python version of the virtual environment
+        """
+        raise NotImplementedError
+
+    def install(self, path, requirements, no_compile=False, report_file=None):
+        """
+        Install requirements into the virtual environment
+
+        :param Path path: Path of the virtual environment
+        :param list[str] requirements: Requirements to install, such as ['bumper==0.1.13']
+        :param bool no_compile: Do not compile Python source files to bytecode
+        :param Path report_file: Write a report of resolved requirements with their hashes to this file if supported
+        """
+        raise NotImplementedError
+
+    def install_locked(self, path, lock_file, no_compile=False):
+        """
+        Install exact requirements from a lock file without resolving dependencies
+
+        :param Path path: Path of the virtual environment
+        :param Path lock_file: Requirements file with all dependencies pinned, optionally with hashes
+        :param bool no_compile: Do not compile Python source files to bytecode
+        """
+        raise NotImplementedError
+
+    def list_installed(self, path):
+        """
+        Installed distributions in the virtual environment
+
+        :param Path path: Path of the virtual environment
+        :return: Dict of distribution name to version
+        """
+        return json.loads(run([str(path / 'bin' / 'python'), '-c', _LIST_INSTALLED_PY], stderr=STDOUT,
+                              env=child_env()))
+
+    def remove_tool(self, path, tool):
+        """
+        Remove a tool that is only needed to install, such as pip
+
+        :param Path path: Path of the virtual environment
+        :param str tool: Name of the tool distribution
+        """
+        raise NotImplementedError
+
+
+class PipBackend(InstallerBackend):
+    """
+    Creates virtual environments using venv and installs using pip. Virtual environments for the Python version that
+    runs autopip are created in-process using :cls:`venv.EnvBuilder` when it bases them on the real interpreter.
+    """
+
+    name = 'pip'
+
+    def create_env(self, path, python_version):
+        env = child_env()
+        python_path = shutil.which(f'python{python_version}', path=env['PATH'])
+
+        if (python_path and os.path.realpath(python_path) == os.path.realpath(sys.executable)
+                and self._env_builder_uses_base_python()):
+            debug('Creating virtual environment in %s using venv.EnvBuilder', path)
+            venv.EnvBuilder(symlinks=os.name != 'nt').create(str(path))
+        else:
+            run([python_path or f'python{python_version}', '-m', 'venv', '--without-pip', str(path)], stderr=STDOUT,
+                env=env)
+
+        env = child_env(path)
+        run([str(path / 'bin' / 'python'), '-m', 'ensurepip', '--upgrade', '--default-pip'], stderr=STDOUT, env=env)
+        run(self._pip(path, 'install', '--upgrade', 'pip', 'wheel'), stderr=STDOUT, env=env)
+
+    def install(self, path, requirements, no_compile=False, report_file=None):
+        no_compile = ['--no-compile'] if no_compile else []
+        # --report is available in pip 22.2+, which requires Python 3.7+
+        report = ['--report', str(report_file)] if report_file and not list(path.glob('lib/python3.6')) else []
+        run(self._pip(path, 'install', *no_compile, *report, *requirements), stderr=STDOUT, env=child_env(path))
+
+    def install_locked(self, path, lock_file, no_compile=False):
+        no_compile = ['--no-compile'] if no_compile else []
+        run(self._pip(path, 'install', *no_compile, '--no-deps', '-r', str(lock_file)), stderr=STDOUT,
+            env=child_env(path))
+
+    def remove_tool(self, path, tool):
+        run(self._pip(path, 'uninstall', '--yes', tool), stderr=STDOUT, env=child_env(path))
+
+    @staticmethod
+    def _env_builder_uses_base_python():
+        """
+        True if :cls:`venv.EnvBuilder` bases virtual environments on the real interpreter. Before Python 3.11, it uses
+        the interpreter of the virtual environment that autopip runs in, such as its own app venv, so app venvs would
+        break once that is removed.
+        """
+        return sys.prefix == sys.base_prefix or sys.version_info >= (3, 11)
+
+    @staticmethod
+    def _pip(path, *args):
+        """ Command to run pip of the virtual environment with the given args """
+        return [str(path / 'bin' / 'python'), '-m', 'pip'] + list(args)
+
+
+class UvBackend(InstallerBackend):
+    """ Creates virtual environments and installs using uv, which is much faster than pip """
+
+    name = 'uv'
+
+    @classmethod
+    def is_available(cls):
+        return bool(shutil.which('uv'))
+
+    def create_env(self, path, python_version):
+        run(['uv', 'venv', '--quiet', '--python', f'python{python_version}', str(path)], stderr=STDOUT,
+            env=child_env())
+
+    def install(self, path, requirements, no_compile=False, report_file=None):
+        compile_bytecode = [] if no_compile else ['--compile-bytecode']
+        run(['uv', 'pip', 'install', '--quiet', '--python', str(path / 'bin' / 'python')] + compile_bytecode
+            + list(requirements), stderr=STDOUT, env=child_env())
+
+    def install_locked(self, path, lock_file, no_compile=False):
+        compile_bytecode = [] if no_compile else ['--compile-bytecode']
+        run(['uv', 'pip', 'install', '--quiet', '--python', str(path / 'bin' / 'python'), '--no-deps']
+            + compile_bytecode + ['-r', str(lock_file)], stderr=STDOUT, env=child_env())
+
+    def remove_tool(self, path, tool):
+        if tool in self.list_installed(path):  # uv does not install pip into virtual environments
+            run(['uv', 'pip', 'uninstall', '--quiet', '--python', str(path / 'bin' / 'python'), tool], stderr=STDOUT,
+                env=child_env())
+
+
+#: Available backends by name
+BACKENDS = {backend.name: backend for backend in [PipBackend, UvBackend]}
+
+
+def get_backend(name=None):
+    """
+    Get the installer backend with the given name
+
+    :param str name: Name of the backend, or "auto" to use the fastest available backend.
+                     Defaults to value of AUTOPIP_BACKEND env var or pip.
+    :return: An instance of :cls:`InstallerBackend`
+    """
+    name = name or os.environ.get(BACKEND_ENV_VAR) or DEFAULT_BACKEND
+
+    if name == 'auto':
+        name = 'uv' if UvBackend.is_available() else DEFAULT_BACKEND
+
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown installer backend: {name}. Available backends: {", ".join(sorted(BACKENDS))}')
+
+    backend = BACKENDS[name]
+    if not backend.is_available():
+        raise MissingError(f'{name} installer backend is not available. Please install it or ensure its path is in '
+                           'PATH.')
+
+    return backend()
@@ -0,0 +1,140 @@
+import json
+from logging import debug
+import os
+from pathlib import Path
+import shutil
+import tarfile
+
+#: Name of the bundle metadata file in bundles
+BUNDLE_INFO_FILE = 'autopip-bundle.json'
+
+#: Directory in bundles with the files of the app version
+BUNDLE_VENV_DIR = 'venv'
+
+#: Version of the bundle format
+BUNDLE_FORMAT = 1
+
+# Files larger than this are not checked for paths to relocate as they are unlikely to be scripts or configs
+_MAX_RELOCATE_SIZE = 1024 * 1024
+
+
+def create_bundle(version_path, bundle_file, info):
+    """
+    Package an installed app version with metadata to relocate it into a compressed archive
+
+    :param Path version_path: Path of the installed app version
+    :param Path bundle_file: Archive file to create
+    :param dict info: Metadata of the app version to include, such as app, version, and python_version
+    :return: Metadata of the bundle
+    """
+    prefix = str(version_path).encode('utf-8')
+    relocate = []
+
+    for path in sorted(version_path.rglob('*')):
+        if path.is_symlink() or not path.is_file() or path.stat().st_size > _MAX_RELOCATE_SIZE:
+            continue
+
+        content = path.read_bytes()
+        if prefix in content and b'\0' not in content:  # Only text files as paths in binary files can not be changed
+            relocate.append(str(path.relative_to(version_path)))
+
+    info = dict(info, format=BUNDLE_FORMAT, prefix=str(version_path), relocate=relocate)
+    info_file = bundle_file.with_name(f'.{bundle_file.name}.{os.getpid()}.json')
+
+    try:
+        info_file.write_text(json.dumps(info, indent=2))
+
+        with tarfile.open(bundle_file, 'w:gz') as tar:
+            tar.add(str(info_file), arcname=BUNDLE_INFO_FILE)
+            tar.add(str(version_path), arcname=BUNDLE_VENV_DIR)
+
+    finally:
+        info_file.unlink()
+
+    return info
+
+
+def read_bundle_info(bundle_file):
+    """
+    Read metadata of the bundle
+
+    :param Path bundle_file: Bundle created by :func:`create_bundle`
+    :return: Dict of metadata
+    """
+    with tarfile.open(bundle_file) as tar:
+        try:
+            info = json.loads(tar.extractfile(BUNDLE_INFO_FILE).read().decode('utf-8'))
+        except KeyError:
+            raise ValueError(f'{bundle_file} is not an autopip bundle as it does not have {BUNDLE_INFO_FILE}')
+
+    if info.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f'{bundle_file} has unsupported bundle format {info.get("format")}. '
+                         'Please upgrade autopip that installs it or re-create the bundle.')
+
+    return info
+
+
+def extract_bundle(bundle_file, version_path, python_path):
+    """
+    Extract the app version from the bundle and relocate it to the given path
+
+    :param Path bundle_file: Bundle created by :func:`create_bundle`
+    :param Path version_path: Path to extract the app version to. It must not exist.
+    :param str python_path: Path to the Python interpreter to use if the one from the bundle does not exist
+    """
+    info = read_bundle_info(bundle_file)
+    tmp_path = version_path.with_name(f'.{version_path.name}.bundle.{os.getpid()}')
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    try:
+        with tarfile.open(bundle_file) as tar:
+            members = []
+            for member in tar.getmembers():
+                if member.name == BUNDLE_INFO_FILE:
+                    continue
+
+                name = Path(member.name)
+                if name.parts[0] != BUNDLE_VENV_DIR or '..' in name.parts or name.is_absolute():
+                    raise ValueError(f'{bundle_file} has an unexpected file: {member.name}')
+
+                if member.islnk():  # Hardlinks from dedupe refer to other files in the archive
+                    member.linkname = str(Path(member.linkname).relative_to(BUNDLE_VENV_DIR))
+
+                member.name = str(name.relative_to(BUNDLE_VENV_DIR))
+                members.append(member)
+
+            # Symlinks to the Python interpreter are absolute, so the stricter "data" filter can not be used
+            kwargs = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}
+            tar.extractall(str(tmp_path), members=members, **kwargs)
+
+        old_prefix = info['prefix'].encode('utf-8')
+        new_prefix = str(version_path).encode('utf-8')
+
+        for relative_path in info['relocate']:
+            path = tmp_path / relative_path
+            path.write_bytes(path.read_bytes().replace(old_prefix, new_prefix))
+
+        _relink_python(tmp_path, python_path)
+
+        tmp_path.rename(version_path)
+
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def _relink_python(venv_path, python_path):
+    """ Point Python symlinks of the virtual environment to the given interpreter if they do not exist on this host """
+    bin_path = venv_path / 'bin'
+
+    for python in bin_path.glob('python*'):
+        if python.is_symlink() and not python.exists():
+            debug('Relinking %s to %s', python, python_path)
+            python.unlink()
+            python.symlink_to(python_path)
+
+            pyvenv_cfg = venv_path / 'pyvenv.cfg'
+            if pyvenv_cfg.exists():
+                pyvenv_cfg.write_text(''.join(
+                    f'home = {os.path.dirname(python_path)}\n' if line.startswith('home ') else line
+                    for line in pyvenv_cfg.read_text().splitlines(True)))
@@ -9,6 +9,9 @@ PYTHON_VERSION = '{}.{}'.format(*sys.version_info[0:2])
 PYTHON_PATH = str(Path(shutil.which('python' + PYTHON_VERSION)).parent)
 IS_MACOS = platform.system() == 'Darwin'
 WAIT_TIMEOUT_MSG = 'No new version was published after an hour, so not gonna wait anymore.'
+#: Env vars with default max seconds and max number of builds for each update run, such as from cron
+UPDATE_MAX_TIME_ENV_VAR = 'AUTOPIP_UPDATE_MAX_TIME'
+UPDATE_MAX_BUILDS_ENV_VAR = 'AUTOPIP_UPDATE_MAX_BUILDS'
 INSTALL_TIMEOUT_MSG = """Uh oh, something is wrong...
   autopip has been running for an hour and is likely stuck, so exiting to prevent resource issues.
   Please report this issue at https://github.com/maxzheng/autopip/issues"""
@@ -0,0 +1,95 @@
+import hashlib
+from logging import debug
+import os
+from pathlib import Path
+from stat import S_ISREG
+
+
+def dedupe(paths, store_root):
+    """
+    Hardlink identical site-packages files in the given app version paths to a shared content store.
+
+    Each unique file content (and permission mode) is stored once in the store and every copy of it is replaced with
+    a hardlink to the stored file, so removing an app version only drops its references and never the content that
+    other versions still use.
+
+    :param list[Path] paths: App version paths to dedupe
+    :param Path store_root: Root of the content store. It must be on the same filesystem as the paths.
+    :return: Tuple of number of files deduped and bytes saved
+    """
+    deduped = saved = 0
+
+    for path in paths:
+        for site_packages in Path(path).glob('lib/python*/site-packages'):
+            for dir_path, _, file_names in os.walk(site_packages):
+                for file_name in file_names:
+                    file_path = os.path.join(dir_path, file_name)
+                    file_stat = os.lstat(file_path)
+
+                    if not S_ISREG(file_stat.st_mode) or not file_stat.st_size:
+                        continue
+
+                    content_key = f'{_hash_file(file_path)}-{file_stat.st_mode & 0o777:o}'
+                    stored_path = store_root / content_key[:2] / content_key
+
+                    try:
+                        if not stored_path.exists():
+                            stored_path.parent.mkdir(parents=True, exist_ok=True)
+                            os.link(file_path, stored_path)
+                            continue
+
+                        stored_stat = stored_path.stat()
+                        if (stored_stat.st_ino, stored_stat.st_dev) == (file_stat.st_ino, file_stat.st_dev):
+                            continue
+
+                        tmp_link = f'{file_path}.autopip-dedupe'
+                        os.link(stored_path, tmp_link)
+                        os.replace(tmp_link, file_path)
+
+                        deduped += 1
+                        saved += file_stat.st_size
+
+                    except OSError as e:  # E.g. store is on another filesystem
+                        debug('Could not dedupe %s: %s', file_path, e)
+                        return deduped, saved
+
+    return deduped, saved
+
+
+def collect_garbage(store_root):
+    """
+    Remove stored files that are no longer referenced by any app version
+
+    :param Path store_root: Root of the content store
+    :return: Number of files removed
+    """
+    removed = 0
+
+    if not store_root.exists():
+        return removed
+
+    for prefix_dir in os.scandir(store_root):
+        if not prefix_dir.is_dir(follow_symlinks=False):
+            continue
+
+        for entry in os.scandir(prefix_dir.path):
+            try:
+                if entry.stat(follow_symlinks=False).st_nlink == 1:  # Only the store references it
+                    os.unlink(entry.path)
+                    removed += 1
+
+            except OSError as e:
+                debug('Could not remove %s: %s', entry.path, e)
+
+    return removed
+
+
+def _hash_file(file_path):
+    """ SHA256 hex digest of the file content """
+    sha = hashlib.sha256()
+
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
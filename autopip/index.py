@@ -0,0 +1,350 @@
+import codecs
+from datetime import datetime
+import json
+from logging import debug, info
+import os
+import queue
+import random
+import socket
+import threading
+from time import time, sleep
+import urllib.error
+import urllib.request
+
+#: Env var with space separated URLs of index mirrors to use in addition to extra-index-url from pip.conf
+MIRRORS_ENV_VAR = 'AUTOPIP_INDEX_MIRRORS'
+
+#: Env var to set how versions from multiple indexes are merged. See :attr:`IndexGroup.MERGE_POLICIES`
+MERGE_POLICY_ENV_VAR = 'AUTOPIP_INDEX_MERGE'
+
+#: Env var to set seconds to wait for an index before also asking the next index
+HEDGE_SECONDS_ENV_VAR = 'AUTOPIP_INDEX_HEDGE_SECONDS'
+
+
+def iter_lines(fp, chunk_size=65536):
+    """
+    Iterate over lines of a page as it is read in chunks so memory usage is flat regardless of the page size.
+    Long lines, such as a page without line breaks, are split after a tag.
+
+    :param fp: File-like object to read bytes from
+    :param int chunk_size: Number of bytes to read at a time
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    remainder = ''
+
+    for chunk in iter(lambda: fp.read(chunk_size), b''):
+        lines = (remainder + decoder.decode(chunk)).split('\n')
+        remainder = lines.pop()
+        yield from lines
+
+        if len(remainder) > chunk_size:
+            split_at = remainder.rfind('>') + 1
+            if split_at:
+                yield remainder[:split_at]
+                remainder = remainder[split_at:]
+
+    remainder += decoder.decode(b'', final=True)
+    if remainder:
+        yield remainder
+
+
+class IndexUnavailable(Exception):
+    """ Indicates the package index is skipped as it failed repeatedly """
+
+
+class IndexClient:
+    """
+    Reads pages from a package index with bounded retries, jittered exponential backoff, a request rate limit, and a
+    circuit breaker that skips the index for a while after repeated failures. The circuit breaker state is saved in a
+    state file, so it is shared across cron runs.
+    """
+
+    #: Number of retries after the first attempt for a page
+    RETRIES = 3
+
+    #: Base and max seconds to wait before retrying. Actual wait is random up to base * 2^retry (full jitter).
+    BACKOFF_SECONDS = 1
+    MAX_BACKOFF_SECONDS = 30
+
+    #: Min seconds between requests to the index
+    MIN_REQUEST_INTERVAL = 0.2
+
+    #: Number of consecutive failed reads (after retries) to open the circuit and skip the index
+    FAILURE_THRESHOLD = 3
+
+    #: Seconds to skip the index once the circuit is open. After that, one read is tried to check if it is back.
+    OPEN_SECONDS = 900
+
+    #: Weight of the latest read when averaging latency of the index
+    LATENCY_WEIGHT = 0.3
+
+    #: HTTP status codes that are retried as the index is likely overloaded or down temporarily
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, index_url, auth=None, state_file=None, timeout=10, save_state=True):
+        """
+        :param str index_url: URL of the index, such as https://pypi.org/simple/
+        :param tuple auth: Tuple of user and password for the index
+        :param Path state_file: File to save the circuit breaker state in
+        :param int timeout: Seconds to wait for the index to respond
+        :param bool save_state: Save changes of the circuit breaker state to the state file. If False, the state file
+                                is only read, such as to show a plan without changing anything.
+        """
+        self.index_url = index_url
+        self.state_file = state_file
+        self.timeout = timeout
+        self.save_state = save_state
+
+        if auth:
+            password_mgr = urllib.request.HTTPPasswordMgrWithDefaultRealm()
+            password_mgr.add_password(None, index_url, auth[0], auth[1])
+            self._opener = urllib.request.build_opener(urllib.request.HTTPBasicAuthHandler(password_mgr))
+        else:
+            self._opener = urllib.request.build_opener()
+
+        self._lock = threading.Lock()
+        self._last_request_time = 0
+        self._state = None  # Used instead of the state file once changed when there is no file or it is not saved
+        self._latency = None  # Latency of reads in this process, which is only saved with circuit breaker changes
+
+    def read(self, url, parse=None):
+        """
+        Read the page at the given url of the index
+
+        :param str url: URL of the page
+        :param callable parse: Function to parse the page as it is read from the index without reading the whole page
+                               into memory. It is given an iterator of lines and may stop early.
+        :return: Content of the page, or the result of parse if set
+        :raise urllib.error.HTTPError: If the index responds with an error that is not retried, such as 404.
+        :raise IndexUnavailable: If the index failed repeatedly and is skipped for now
+        """
+        state = self._load_state()
+        if state.get('open_until', 0) > time():
+            raise IndexUnavailable(f'Skipped {url} as {self.index_url} failed repeatedly. Will try again after '
+                                   f'{datetime.fromtimestamp(state["open_until"]).strftime("%H:%M")}')
+
+        for retry in range(self.RETRIES + 1):
+            try:
+                self._wait_for_rate_limit()
+                start_time = time()
+
+                with self._opener.open(url, timeout=self.timeout) as fp:
+                    content = parse(iter_lines(fp)) if parse else fp.read().decode('utf-8')
+
+                self._record_latency(time() - start_time, state)
+
+                return content
+
+            except Exception as e:
+                if not self._is_retriable(e):
+                    raise
+
+                if retry == self.RETRIES:
+                    state = self._load_state()
+                    failures = state.get('failures', 0) + 1
+                    state = {'failures': failures, 'latency': self.latency}
+                    if failures >= self.FAILURE_THRESHOLD:
+                        state['open_until'] = time() + self.OPEN_SECONDS
+                        info(f'{self.index_url} failed {failures} times in a row, so skipping it for '
+                             f'{self.OPEN_SECONDS // 60} minutes')
+                    self._save_state(state)
+
+                    raise Exception(f'Failed to read from {url} after {retry + 1} attempts: {e}')
+
+                wait = self._backoff_seconds(retry, e)
+                debug('Failed to read from %s (%s), so retrying in %.1f seconds', url, e, wait)
+                sleep(wait)
+
+    @property
+    def latency(self):
+        """ Average seconds to read a page from the index, or None if not known yet """
+        return self._latency if self._latency is not None else self._load_state().get('latency')
+
+    def _record_latency(self, seconds, state):
+        """
+        Update average latency with the latency of a successful read. It is kept in memory, and only saved when the
+        read also resets failures or closes the circuit, so successful reads do not write the state file.
+
+        :param float seconds: Seconds of the read
+        :param dict state: State of the index loaded before the read
+        """
+        latency = self.latency
+        latency = seconds if latency is None else latency * (1 - self.LATENCY_WEIGHT) + seconds * self.LATENCY_WEIGHT
+        self._latency = round(latency, 3)
+
+        if state.get('failures') or state.get('open_until'):
+            self._save_state({'latency': self._latency})
+
+    def _is_retriable(self, e):
+        """ True if the error is likely temporary """
+        if isinstance(e, urllib.error.HTTPError):
+            return e.code in self.RETRY_STATUS_CODES
+
+        return isinstance(e, (urllib.error.URLError, socket.timeout, ConnectionError))
+
+    def _backoff_seconds(self, retry, e):
+        """ Seconds to wait before the given retry: Retry-After from the index if set, otherwise a jittered backoff """
+        retry_after = isinstance(e, urllib.error.HTTPError) and e.headers and e.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(int(retry_after), self.MAX_BACKOFF_SECONDS)
+
+        return random.uniform(0, min(self.MAX_BACKOFF_SECONDS, self.BACKOFF_SECONDS * 2 ** retry))
+
+    def _wait_for_rate_limit(self):
+        """ Wait so requests to the index are at least :attr:`MIN_REQUEST_INTERVAL` apart """
+        with self._lock:
+            wait = self._last_request_time + self.MIN_REQUEST_INTERVAL - time()
+            if wait > 0:
+                sleep(wait)
+            self._last_request_time = time()
+
+    def _load_state(self):
+        """ Circuit breaker state and latency of the index """
+        if self._state is not None or not self.state_file:
+            return self._state or {}
+
+        if self.state_file.exists():
+            try:
+                return json.loads(self.state_file.read_text()).get(self.index_url, {})
+            except Exception as e:
+                debug('Could not read %s: %s', self.state_file, e)
+
+        return {}
+
+    def _save_state(self, state):
+        """ Save circuit breaker state and latency of the index, keeping state of other indexes """
+        state = {k: v for k, v in state.items() if v is not None}
+
+        if not (self.state_file and self.save_state):
+            self._state = state
+            return
+
+        try:
+            with self._lock:
+                states = json.loads(self.state_file.read_text()) if self.state_file.exists() else {}
+                states[self.index_url] = state
+
+                # Write to a temp file and then rename so readers never see a partially written file
+                self.state_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_state_file = self.state_file.with_name(f'.{self.state_file.name}.{os.getpid()}')
+                tmp_state_file.write_text(json.dumps(states))
+                tmp_state_file.replace(self.state_file)
+
+        except Exception as e:
+            debug('Could not save %s: %s', self.state_file, e)
+
+
+class IndexGroup:
+    """
+    Looks up projects from a primary index and secondary indexes, such as extra-index-url or mirrors. The primary
+    index is asked first, and if it does not answer within the hedge seconds, the next index is also asked, preferring
+    the fastest secondary indexes based on their recorded latency.
+    """
+
+    #: How versions from multiple indexes are merged:
+    #: - first: Use the first index that has versions for the project.
+    #: - union: Ask all indexes at the same time and use versions from all of them, like pip does.
+    MERGE_POLICIES = ('first', 'union')
+
+    def __init__(self, clients, merge_policy=None, hedge_seconds=None):
+        """
+        :param list[IndexClient] clients: Clients for the indexes with the primary index first
+        :param str merge_policy: One of :attr:`MERGE_POLICIES`. Defaults to value of AUTOPIP_INDEX_MERGE env var or
+                                 first.
+        :param float hedge_seconds: Seconds to wait for an index before also asking the next index. Defaults to value
+                                    of AUTOPIP_INDEX_HEDGE_SECONDS env var or 1.
+        """
+        self.clients = clients
+        self.merge_policy = merge_policy or os.environ.get(MERGE_POLICY_ENV_VAR) or 'first'
+        self.hedge_seconds = float(hedge_seconds or os.environ.get(HEDGE_SECONDS_ENV_VAR) or 1)
+
+        if self.merge_policy not in self.MERGE_POLICIES:
+            raise ValueError(f'Unknown index merge policy: {self.merge_policy}. '
+                             f'Available policies: {", ".join(self.MERGE_POLICIES)}')
+
+    @property
+    def index_url(self):
+        """ URL of the primary index """
+        return self.clients[0].index_url
+
+    def ordered_clients(self):
+        """ Clients in the order to ask: primary first, then the rest from fastest to slowest """
+        return self.clients[:1] + sorted(self.clients[1:], key=lambda c: c.latency or 0)
+
+    def lookup(self, name, parse):
+        """
+        Look up the project page of the given name
+
+        :param str name: Name of the project
+        :param callable parse: Function that parses lines of the project page as they are read and returns a list of
+                               versions, or a dict of version to its release info
+        :return: List of versions (or dict of version to release info from the first index that has the version)
+                 merged per :attr:`merge_policy`
+        :raise urllib.error.HTTPError: With 404 code if the project does not exist on any index
+        """
+        clients = self.ordered_clients()
+
+        if len(clients) == 1:
+            return clients[0].read(clients[0].index_url + name + '/', parse)
+
+        answers = queue.Queue()
+
+        def ask(client):
+            try:
+                answers.put((client, client.read(client.index_url + name + '/', parse), None))
+            except Exception as e:
+                answers.put((client, None, e))
+
+        def ask_next():
+            client = clients[len(asked)]
+            asked.append(client)
+            # Daemon thread so a slow index that lost the race does not hold up exiting
+            threading.Thread(target=ask, args=(client,), daemon=True).start()
+
+        asked = []
+        versions_by_client = {}
+        errors = []
+
+        ask_next()
+        while self.merge_policy == 'union' and len(asked) < len(clients):
+            ask_next()
+
+        while len(versions_by_client) + len(errors) < len(asked):
+            try:
+                client, versions, e = answers.get(timeout=self.hedge_seconds if len(asked) < len(clients) else None)
+
+            except queue.Empty:
+                debug('%s did not answer within %s seconds, so also asking %s', asked[-1].index_url,
+                      self.hedge_seconds, clients[len(asked)].index_url)
+                ask_next()
+                continue
+
+            if e:
+                debug('Could not look up %s on %s: %s', name, client.index_url, e)
+                errors.append(e)
+            else:
+                versions_by_client[client] = versions
+
+            if self.merge_policy == 'first' and versions:
+                return versions
+
+            # Failed or no versions, so ask the next index now instead of waiting
+            if len(versions_by_client) + len(errors) == len(asked) and len(asked) < len(clients):
+                ask_next()
+
+        if versions_by_client:
+            merged_versions = {}
+            for client in clients:
+                client_versions = versions_by_client.get(client, {})
+                if not isinstance(client_versions, dict):
+                    client_versions = dict.fromkeys(client_versions)
+
+                for version, release_info in client_versions.items():
+                    merged_versions.setdefault(version, release_info)
+
+            if any(isinstance(v, dict) for v in versions_by_client.values()):
+                return merged_versions
+            return list(merged_versions)
+
+        # Not found only if no index had other issues
+        raise next((e for e in errors if not isinstance(e, urllib.error.HTTPError) or e.code != 404), errors[0])
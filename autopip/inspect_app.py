@@ -10,9 +10,10 @@ def gather_intel(app):
     try:
         from importlib.metadata import entry_points
 
-        scripts = [e.name for e in entry_points(group='console_scripts') if e.dist.name == app]
+        console_scripts = [e for e in entry_points(group='console_scripts') if e.dist.name == app]
         intel = {
-            'scripts': scripts,
+            'scripts': [e.name for e in console_scripts],
+            'entry_points': {e.name: e.value for e in console_scripts},
             'group_specs': []  # Not supported as it isn't used anymore
         }
 
@@ -21,6 +22,7 @@ def gather_intel(app):
         dist = pkg_resources.get_distribution(app)
         intel = {
             'scripts': get_scripts(dist),
+            'entry_points': get_entry_points(dist),
             'group_specs': get_group_specs(dist),
         }
 
@@ -54,6 +56,10 @@ def get_scripts(dist):
     return list(scripts)
 
 
+def get_entry_points(dist):
+    return {name: str(e).split('=', 1)[1].strip() for name, e in dist.get_entry_map('console_scripts').items()}
+
+
 def get_group_specs(dist):
     app_specs = []
 
@@ -0,0 +1,214 @@
+from datetime import datetime
+import json
+from logging import debug, info
+import os
+from pathlib import Path
+import shutil
+from time import time
+
+#: Name of the .pth file in app versions that adds the site-packages of the base layer to sys.path
+BASE_PTH_FILE = '_autopip_base.pth'
+
+# Packages installed in every virtual environment, which are not considered as shadowing the layer
+_TOOLS = {'pip', 'setuptools', 'wheel'}
+
+
+class BaseLayer:
+    """
+    Shared virtual environment per Python version with common packages, such as requests, that apps opted in to the
+    layer inherit via a .pth file instead of installing their own copies. Packages that an app needs at a different
+    version are installed in the app's own site-packages, which comes first in sys.path, so they are private copies.
+
+    Layers are never changed once built. Refreshing builds a new layer for new builds of apps, and old layers are
+    removed once no app version uses them.
+    """
+
+    #: Max seconds to build a layer. Incomplete layers older than this are left over from a crash.
+    BUILD_SECONDS = 86400
+
+    def __init__(self, paths, python_version):
+        """
+        :param AppsPath paths: Paths of the apps
+        :param str python_version: Python version of the layer
+        """
+        self.paths = paths
+        self.python_version = python_version
+
+        #: Path with all layers of the Python version
+        self.path = paths.install_root / '.base' / python_version
+
+        #: Requirements of the layer
+        self.requirements_file = self.path / 'requirements.txt'
+
+        # Symlink to the current layer
+        self._current_symlink = self.path / 'current'
+
+    def __repr__(self):
+        return f"BaseLayer('{self.python_version}')"
+
+    @property
+    def current_path(self):
+        """ Path of the current layer, or None if it was not built """
+        return self._current_symlink.resolve() if self._current_symlink.exists() else None
+
+    @property
+    def requirements(self):
+        """ List of requirements of the layer """
+        if not self.requirements_file.exists():
+            return []
+
+        return [r for r in self.requirements_file.read_text().split('\n') if r.strip()]
+
+    def pins(self, layer_path=None):
+        """ Dict of distribution name to version installed in the layer (defaults to current) """
+        layer_path = layer_path or self.current_path
+        pins_file = layer_path and layer_path / 'pins.json'
+
+        return json.loads(pins_file.read_text()) if pins_file and pins_file.exists() else {}
+
+    def build(self, installer, requirements=None):
+        """
+        Build a new layer with the latest versions of the requirements and make it the current layer if it differs
+
+        :param InstallerBackend installer: Installer to build the layer with
+        :param list[str] requirements: Requirements to install, such as ['requests', 'click<8']. Defaults to the
+                                       requirements of the current layer.
+        :return: True if a new layer was built and is now the current layer, otherwise False if nothing changed
+        """
+        requirements = requirements or self.requirements
+        if not requirements:
+            raise ValueError(f'No requirements for the shared base layer of Python {self.python_version}')
+
+        layer_path = self.path / datetime.now().strftime('%Y%m%d%H%M%S%f')
+        info(f'Building shared base layer for Python {self.python_version} in {layer_path}')
+
+        try:
+            installer.create_env(layer_path, self.python_version)
+            installer.install(layer_path, requirements)
+            installer.remove_tool(layer_path, 'pip')  # So pip of the layer is not visible to apps
+            pins = installer.list_installed(layer_path)
+            (layer_path / 'pins.json').write_text(json.dumps(pins, indent=2, sort_keys=True))
+
+        except BaseException:
+            shutil.rmtree(layer_path, ignore_errors=True)
+            raise
+
+        if pins == self.pins() and requirements == self.requirements:
+            info('Shared base layer is up-to-date')
+            shutil.rmtree(layer_path)
+            return False
+
+        self.requirements_file.write_text('\n'.join(requirements) + '\n')
+
+        tmp_symlink = self.path / f'.current.{os.getpid()}'
+        tmp_symlink.symlink_to(layer_path.name)
+        tmp_symlink.replace(self._current_symlink)
+
+        info('Shared base layer has: %s', ', '.join(f'{n}=={v}' for n, v in sorted(pins.items())))
+
+        return True
+
+    def link(self, version_path):
+        """
+        Add the current layer to the sys.path of the app version
+
+        :param Path version_path: Path of the app version
+        :return: Path of the layer, or None if there is no current layer
+        """
+        layer_path = self.current_path
+        if not layer_path:
+            return
+
+        layer_site_packages = self._site_packages(layer_path)
+        app_site_packages = self._site_packages(version_path)
+        if not (layer_site_packages and app_site_packages):
+            return
+
+        (app_site_packages / BASE_PTH_FILE).write_text(str(layer_site_packages) + '\n')
+
+        return layer_path
+
+    def unlink(self, version_path):
+        """ Remove the layer from the sys.path of the app version """
+        site_packages = self._site_packages(version_path)
+
+        if site_packages and (site_packages / BASE_PTH_FILE).exists():
+            (site_packages / BASE_PTH_FILE).unlink()
+
+    def shadowed(self, version_path, layer_path):
+        """
+        Packages of the layer that the app version installed its own copy of, such as when it needs another version
+
+        :param Path version_path: Path of the app version
+        :param Path layer_path: Path of the layer the app version uses
+        :return: Dict of distribution name to version of the app's copy for versions that differ from the layer
+        """
+        site_packages = self._site_packages(version_path)
+        if not site_packages:
+            return {}
+
+        layer_pins = {_normalize(n): v for n, v in self.pins(layer_path).items()}
+        shadowed = {}
+
+        for dist_info in site_packages.glob('*.dist-info'):
+            name, _, version = dist_info.name[:-len('.dist-info')].partition('-')
+            if _normalize(name) not in _TOOLS and layer_pins.get(_normalize(name), version) != version:
+                shadowed[name] = version
+
+        return shadowed
+
+    def own_pins(self, version_path, layer_path, installed):
+        """
+        Distributions installed in the app version itself, excluding the ones it inherits from the layer
+
+        :param Path version_path: Path of the app version
+        :param Path layer_path: Path of the layer the app version uses
+        :param dict installed: Dict of distribution name to version of all distributions visible to the app version,
+                               which includes the ones from the layer
+        :return: Dict of distribution name to version
+        """
+        layer_pins = {_normalize(n) for n in self.pins(layer_path)}
+        shadowed = {_normalize(n) for n in self.shadowed(version_path, layer_path)}
+
+        return {n: v for n, v in installed.items() if _normalize(n) not in layer_pins or _normalize(n) in shadowed}
+
+    def collect_garbage(self):
+        """
+        Remove layers that are not current and are not used by any app version
+
+        :return: List of removed layer paths
+        """
+        if not self.path.exists():
+            return []
+
+        used = {self.current_path}
+        for pth_file in self.paths.install_root.glob(f'*/*/lib/python*/site-packages/{BASE_PTH_FILE}'):
+            try:
+                used.add(Path(pth_file.read_text().strip()).resolve().parents[2])  # <layer>/lib/pythonX.Y/site-packages
+            except Exception as e:
+                debug('Could not read %s: %s', pth_file, e)
+
+        removed = []
+        for layer_path in self.path.iterdir():
+            if not layer_path.is_dir() or layer_path.is_symlink() or layer_path.resolve() in used:
+                continue
+
+            # Skip layers that are being built, unless they were left over from a crash a while ago
+            if not (layer_path / 'pins.json').exists() and layer_path.stat().st_mtime > time() - self.BUILD_SECONDS:
+                continue
+
+            debug('Removing unused shared base layer %s', layer_path)
+            shutil.rmtree(layer_path, ignore_errors=True)
+            removed.append(layer_path)
+
+        return removed
+
+    @staticmethod
+    def _site_packages(path):
+        """ Site-packages of the virtual environment """
+        return next(iter(path.glob('lib/python*/site-packages')), None)
+
+
+def _normalize(name):
+    """ Normalize distribution name for comparison """
+    return name.lower().replace('-', '_').replace('.', '_')
@@ -0,0 +1,91 @@
+import json
+from logging import debug
+import re
+
+#: Tools that are only needed to install and are removed afterwards, so they are not locked
+UNLOCKED_DISTS = {'pip'}
+
+
+def write_lockfile(lock_file, app, version, python_version, report_file=None, installed=None):
+    """
+    Write the resolved dependencies of an app version as a pip requirements file pinned by version and hash
+
+    :param Path lock_file: Lock file to write
+    :param str app: Name of the app
+    :param str version: Version of the app
+    :param str python_version: Python version the app was installed with
+    :param Path report_file: Installation report from pip (--report) that contains resolved dependencies and their
+                             hashes. If it does not exist, installed is used without hashes.
+    :param dict installed: Dict of installed distribution name to version as a fallback if there is no report.
+    """
+    pins = {}
+
+    if report_file and report_file.exists():
+        try:
+            report = json.load(report_file.open())
+
+            for item in report.get('install', []):
+                archive_info = item.get('download_info', {}).get('archive_info', {})
+                hashes = archive_info.get('hashes') or dict([archive_info['hash'].split('=', 1)]
+                                                            if archive_info.get('hash') else [])
+                pins[item['metadata']['name']] = (item['metadata']['version'],
+                                                  [f'{algo}:{value}' for algo, value in sorted(hashes.items())])
+
+        except Exception as e:
+            debug('Could not parse pip report %s: %s', report_file, e)
+            pins = {}
+
+    if not pins and installed:
+        pins = {name: (dist_version, []) for name, dist_version in installed.items()}
+
+    if not pins:
+        raise ValueError(f'No resolved dependencies found for {app} {version}')
+
+    # Hashes must be set for all or none of the requirements for pip to install them
+    if not all(hashes for _, hashes in pins.values()):
+        pins = {name: (dist_version, []) for name, (dist_version, _) in pins.items()}
+
+    lines = [f'# Locked dependencies of {app}=={version} for Python {python_version}, generated by autopip']
+
+    for name, (dist_version, hashes) in sorted(pins.items(), key=lambda p: _normalize(p[0])):
+        if _normalize(name) in UNLOCKED_DISTS:
+            continue
+
+        lines.append(' \\\n    '.join([f'{name}=={dist_version}'] + [f'--hash={h}' for h in hashes]))
+
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    lock_file.write_text('\n'.join(lines) + '\n')
+
+
+def locked_version(lock_file, name):
+    """
+    Get the version of the given distribution from the lock file
+
+    :param Path lock_file: Lock file to read
+    :param str name: Name of the distribution
+    :return: Locked version or None if it is not in the lock file
+    """
+    pin_re = re.compile(r'^([A-Za-z0-9][A-Za-z0-9._-]*)==([^\s;\\]+)')
+
+    for line in lock_file.read_text().split('\n'):
+        match = pin_re.match(line)
+        if match and _normalize(match.group(1)) == _normalize(name):
+            return match.group(2)
+
+
+def locked_python_version(lock_file):
+    """
+    Get the Python version that the dependencies in the lock file were resolved for
+
+    :param Path lock_file: Lock file to read
+    :return: Python version from the header written by :func:`write_lockfile`, or None if it is not known
+    """
+    with lock_file.open() as fp:
+        match = re.search(r' for Python (\S+), generated by autopip', fp.readline())
+
+    return match and match.group(1)
+
+
+def _normalize(name):
+    """ Normalize distribution name per PEP 503 """
+    return re.sub(r'[-_.]+', '-', name).lower()
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+import fcntl
+from logging import info
+import threading
+
+# Lock files held by the current thread so nested locking of the same file does not deadlock
+_held = threading.local()
+
+
+@contextmanager
+def file_lock(lock_file, wait_msg=None):
+    """
+    Hold an exclusive advisory lock on the given file for the duration of the context. This is reentrant per thread.
+
+    :param Path lock_file: File to lock. It is created if it does not exist.
+    :param str wait_msg: Message to show if we need to wait for another process to release the lock
+    :return: Context manager that yields True if we had to wait for the lock, otherwise False
+    """
+    held = _held.__dict__.setdefault('files', set())
+    lock_key = str(lock_file)
+
+    if lock_key in held:
+        yield False
+        return
+
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(lock_file, 'a') as fp:
+        try:
+            fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            waited = False
+
+        except BlockingIOError:
+            if wait_msg:
+                info(wait_msg)
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            waited = True
+
+        held.add(lock_key)
+        try:
+            yield waited
+
+        finally:
+            held.discard(lock_key)
+            fcntl.flock(fp, fcntl.LOCK_UN)
@@ -1,6 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
 from configparser import RawConfigParser
 from collections import defaultdict
+from datetime import datetime
 from functools import lru_cache
+import html
 import json
 from logging import info, error, debug
 import os
@@ -11,12 +14,22 @@ import shutil
 from subprocess import CalledProcessError, STDOUT
 import sys
 from time import time, sleep
-import urllib.request
 import urllib.error
 
 from autopip import crontab, exceptions
+from autopip.backends import get_backend
+from autopip.bundles import create_bundle, extract_bundle, read_bundle_info
 from autopip.constants import UpdateFreq, PYTHON_VERSION
-from autopip.utils import run, sorted_versions
+from autopip.dedupe import dedupe, collect_garbage
+from autopip.index import IndexClient, IndexGroup, MIRRORS_ENV_VAR
+from autopip.layers import BASE_PTH_FILE, BaseLayer
+from autopip.lockfiles import locked_python_version, locked_version, write_lockfile
+from autopip.locks import file_lock
+from autopip.results import ActionResult
+from autopip.shims import SHIMS_DIR, write_shims
+from autopip.symlinks import apply_links, plan_links, scan_links
+from autopip.trash import TRASH_DIR, has_trash, reap_in_background, trash
+from autopip.utils import child_env, find_cycles, in_time_window, low_priority, run, sorted_versions, supports_python
 
 
 class AppsManager:
@@ -35,7 +48,26 @@ class AppsManager:
         # PyPI auth. Tuple of user and password.
         self._index_auth = None
 
-    def install(self, apps, update=None, python_version=None, wait=False):
+        # Extra indexes to look up apps from, such as extra-index-url in pip.conf. List of tuples of url and auth.
+        self._extra_indexes = []
+
+        # Client to look up apps from PyPI and extra indexes. An instance of :cls:`IndexGroup`
+        self._index = None
+
+        # Versions read from PyPI by app name
+        self._versions_cache = {}
+
+        # Requires-Python specifiers and yanked status of versions read from PyPI by app name and then by version.
+        # Each is a list of set of specifiers of the files and True if all files of the version were yanked.
+        self._release_info = defaultdict(dict)
+
+        # Skip removing unused base layers and trash after changes, such as for workers of :meth:`apply` as it is
+        # done once after all of them finish.
+        self._defer_cleanup = False
+
+    def install(self, apps, update=None, python_version=None, wait=False, keep_versions=None, activate_window=None,
+                stage=False, backend=None, lock_file=None, force=False, raise_on_failure=True, launcher=None,
+                base=None, max_time=None, max_builds=None, adaptive_update=None):
         """
         Install the given apps
 
@@ -43,9 +75,31 @@ class AppsManager:
         :param UpdateFreq|None update: How often to update
         :param str python_version: Python version to run the app
         :param bool wait: Wait for a new version to be published and then install it.
+        :param int keep_versions: Number of versions to keep installed for rollback
+        :param str activate_window: When to activate staged versions: HH:MM-HH:MM window or "manual"
+        :param bool stage: Only build new versions ahead of time and activate them per their activation window.
+        :param str backend: Name of the installer backend to use for the apps
+        :param Path lock_file: Lock file from another install to install exact dependencies for apps pinned in it
+        :param bool force: Check for new versions even if the apps are not due for an update when not run from a
+                           terminal, such as from cron or when embedded.
+        :param bool raise_on_failure: Raise :cls:`exceptions.FailedAction` if any app failed to install
+        :param str launcher: How to launch scripts of the apps. One of :data:`autopip.shims.LAUNCHERS`.
+        :param bool base: Inherit common packages from the shared base layer of the Python version. See :meth:`base`.
+        :param int max_time: Max seconds to spend. Apps left when it is used up are deferred, but at least one app is
+                             always done.
+        :param int max_builds: Max number of apps to install or update. Apps left after that are deferred.
+        :param bool adaptive_update: Check for new versions less often for apps that are rarely released, based on
+                                     when new versions were seen. See :meth:`App.update_interval`.
+        :return: List of :cls:`ActionResult` for the apps
         """
         self._set_index()
 
+        if activate_window and activate_window != 'manual':
+            try:
+                in_time_window(activate_window)
+            except Exception:
+                raise ValueError(f'Invalid activation window: {activate_window}. Please use HH:MM-HH:MM or manual.')
+
         autopip_path = shutil.which('autopip')
         if (self.paths.is_user and sys.stdout.isatty() and not list(self.apps) and autopip_path
                 and autopip_path.startswith(str(self.paths.SYSTEM_SYMLINK_ROOT))):
@@ -54,9 +108,18 @@ class AppsManager:
             info('  To install for everyone, cancel using CTRL+C and then re-run using sudo.')
 
         failed_apps = []
+        updated_apps = []
+        deferred_apps = []
+        results = []
         printed_wait = False
+        run_start_time = time()
 
         for name in apps:
+            start_time = time()
+            result = ActionResult(name[0] if isinstance(name, tuple) else name)
+            results.append(result)
+            app_spec = None
+
             try:
                 if isinstance(name, tuple):  # From app.group_specs()
                     name, update = name
@@ -64,11 +127,45 @@ class AppsManager:
                         update = UpdateFreq.from_name(update)
 
                 app_spec = next(iter(pkg_resources.parse_requirements(name)))
-                app, updated = self._install_app(app_spec, update=update, python_version=python_version, wait=wait)
+                result.app = app_spec.name
+
+                old_app = App(app_spec.name, self.paths, debug=self.debug)
+
+                if len(results) > 1 and (max_time and start_time - run_start_time >= max_time
+                                         or max_builds is not None and len(updated_apps) >= max_builds):
+                    if not self._should_check(old_app, update, wait=wait, force=force):
+                        continue  # Not due yet, so nothing to defer
+
+                    result.action = 'defer'
+                    deferred_apps.append(old_app.name)
+                    if old_app.is_installed and not old_app.settings().get('deferred_at'):
+                        old_app.settings(deferred_at=round(start_time))
+                    continue
+
+                result.old_version = old_app.current_version
+                old_scripts = old_app.current_scripts() if result.old_version else set()
+
+                app, updated = self._install_app(app_spec, update=update, python_version=python_version, wait=wait,
+                                                 keep_versions=keep_versions, activate_window=activate_window,
+                                                 stage=stage, backend=backend, lock_file=lock_file, force=force,
+                                                 launcher=launcher, base=base, adaptive_update=adaptive_update)
+
+                result.new_version = app.current_version
+                if updated and app.staged_version and app.staged_version != app.current_version:
+                    result.action = 'stage'
+                    result.new_version = app.staged_version
+                elif updated and not result.old_version:
+                    result.action = 'install'
+                elif updated and result.old_version != result.new_version:
+                    result.action = 'upgrade'
+
+                if result.changed and result.action != 'stage':
+                    result.set_scripts(old_scripts, app.current_scripts())
 
                 if updated:
+                    updated_apps.append(app)
                     printed_wait = False
-                    group_specs = app.group_specs()
+                    group_specs = not stage and app.group_specs()
                     if group_specs:
                         info('This app has defined "autopip" entry points to install: %s', ' '.join(
                              s[0] for s in group_specs))
@@ -82,82 +179,310 @@ class AppsManager:
                     printed_wait = True
 
             except Exception as e:
-                error(f'! {e}', exc_info=self.debug)
+                error(f'! {e}', exc_info=self.debug and not isinstance(e, exceptions.MissingError))
                 failed_apps.append(name)
+                result.fail(e)
                 printed_wait = False
 
-        if failed_apps:
+                # Remember the failure so the app goes after others in the next update run with a budget
+                failed_app = app_spec and App(app_spec.name, self.paths)
+                if failed_app and failed_app.is_installed:
+                    failed_app.settings(last_failure=round(time()))
+
+            finally:
+                result.seconds = round(time() - start_time, 3)
+
+        if deferred_apps:
+            info('Deferred to the next run as the update budget was used up: %s', ', '.join(deferred_apps))
+
+        # Remove old versions after all apps are installed so it does not hold up the next app
+        for app in updated_apps:
+            try:
+                with app.lock():
+                    app.prune()
+            except Exception as e:
+                debug('Could not remove old versions of %s: %s', app.name, e)
+
+        if updated_apps:
+            self._collect_base_layers()
+
+        # Also resumes reaping trash left by a crash, even if nothing changed
+        self._reap_trash()
+
+        if failed_apps and raise_on_failure:
             raise exceptions.FailedAction()
 
-    def _install_app(self, app_spec, update=None, python_version=None, wait=False):
+        return results
+
+    def _install_app(self, app_spec, update=None, python_version=None, wait=False, keep_versions=None,
+                     activate_window=None, stage=False, backend=None, lock_file=None, force=False, launcher=None,
+                     base=None, adaptive_update=None):
         """ Install the given app """
         app = App(app_spec.name, self.paths, debug=self.debug)
         updated = False
 
-        # Skip update if install was done within the update frequency when run from cron
-        if (sys.stdout.isatty() or not app.is_installed or wait
-                or update and app.path.stat().st_mtime + update.seconds < time()):
-            if app.is_installed:
-                app.path.touch()
+        # If another process is installing the same app, wait and then reuse its result as the version path would
+        # exist and the update check below would consider the app as recently updated.
+        with app.lock():
+            # Skip update if install was done within the update frequency when run from cron
+            if self._should_check(app, update, wait=wait, force=force):
+                if app.is_installed:
+                    app.path.touch()
+
+                # Use exact version from lock file for identical installs across hosts
+                locked = lock_file and locked_version(lock_file, app.name)
+                if locked and locked not in app_spec:
+                    raise ValueError(f'{app.name}=={locked} from {lock_file} does not match {app_spec}')
+
+                python_version = python_version or app.settings().get('python_version') or PYTHON_VERSION
+                version = locked or self._app_version(app_spec, python_version=python_version)
+                if app.is_installed and not locked:
+                    app.record_release(version)
+
+                # Skip versions that failed to install recently when run from cron instead of rebuilding every run
+                failed_at = not (sys.stdout.isatty() or force) and app.failed_build(version, python_version)
+                if failed_at:
+                    debug(f'Skipping {app.name} {version} as it failed to install using Python {python_version} at '
+                          f'{failed_at:%Y-%m-%d %H:%M}')
+                    return app, updated
+
+                # Apps with an activation window are always staged when updated from cron
+                if app.is_installed and (stage or not sys.stdout.isatty() and app.settings().get('activate_window')):
+                    updated = app.stage(version)
+
+                    if updated and app.can_activate_staged:
+                        info(f'Activating {app.name} {version}')
+                        app.activate(version)
+                    elif updated:
+                        info(f'{app.name} {version} is staged and will be activated per its activation window: '
+                             f'{app.settings()["activate_window"]}')
+
+                elif not wait or version != app.current_version:
+                    updated = app.install(version, app_spec, update=update, python_version=python_version,
+                                          keep_versions=keep_versions, backend=backend,
+                                          lock_file=locked and lock_file, launcher=launcher, base=base)
+
+                    if activate_window:
+                        app.settings(activate_window=activate_window)
+
+                    if adaptive_update is not None and app.is_installed:
+                        app.settings(adaptive_update=adaptive_update)
+
+                # Checked and installed the latest version, so the app is no longer deferred or failing
+                settings = app.settings()
+                if settings.get('deferred_at') or settings.get('last_failure'):
+                    app.settings(deferred_at=None, last_failure=None)
 
-            version = self._app_version(app_spec)
+            else:
+                debug(f'{app.name} does not need to be updated yet.')
 
-            if not wait or version != app.current_version:
-                updated = app.install(version, app_spec, update=update, python_version=python_version)
+        return app, updated
 
-        else:
-            debug(f'{app.name} does not need to be updated yet.')
+    @staticmethod
+    def _should_check(app, update, wait=False, force=False):
+        """ True if the app should be checked for a new version, which is only when it is due if run from cron """
+        return bool(sys.stdout.isatty() or force or not app.is_installed or wait or update and app.update_due(update))
 
-        return app, updated
+    def install_bundle(self, bundle_file, update=None, keep_versions=None, activate_window=None, launcher=None):
+        """
+        Install an app version from a bundle created by :meth:`bundle` by extracting it instead of building it, and
+        then set it as the current version like :meth:`install`.
 
-    def _app_version(self, app_spec):
-        """ Get app version from PyPI """
-        pkg_index_url = self._index_url + app_spec.name + '/'
+        :param Path bundle_file: Bundle file to install from
+        :param UpdateFreq|None update: How often to update
+        :param int keep_versions: Number of versions to keep installed for rollback
+        :param str activate_window: When to activate staged versions: HH:MM-HH:MM window or "manual"
+        :param str launcher: How to launch scripts of the app. One of :data:`autopip.shims.LAUNCHERS`.
+        :return: :cls:`ActionResult` for the app
+        """
+        bundle = read_bundle_info(bundle_file)
+        app = App(bundle['app'], self.paths, debug=self.debug)
+        app_spec = next(iter(pkg_resources.parse_requirements(bundle['app_spec'])))
+        start_time = time()
 
-        try:
-            if self._index_auth:
-                password_mgr = urllib.request.HTTPPasswordMgrWithDefaultRealm()
-                password_mgr.add_password(None, self._index_url, self._index_auth[0], self._index_auth[1])
-                handler = urllib.request.HTTPBasicAuthHandler(password_mgr)
-                opener = urllib.request.build_opener(handler)
+        with app.lock():
+            result = ActionResult(app.name, old_version=app.current_version)
+            old_scripts = app.current_scripts() if result.old_version else set()
 
-            else:
-                opener = urllib.request.build_opener()
+            app.install(bundle['version'], app_spec, update=update, python_version=bundle['python_version'],
+                        keep_versions=keep_versions, bundle_file=bundle_file, launcher=launcher)
 
-            with opener.open(str(pkg_index_url), timeout=10) as fp:
-                version_links = fp.read().decode('utf-8')
+            if activate_window:
+                app.settings(activate_window=activate_window)
 
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                raise NameError(f'{app_spec.name} does not exist on {self._index_url}')
-            else:
-                raise Exception(f'Failed to read from {pkg_index_url}: {e}')
+            result.new_version = app.current_version
+            if result.new_version != result.old_version:
+                result.action = 'upgrade' if result.old_version else 'install'
+                result.set_scripts(old_scripts, app.current_scripts())
+
+            try:
+                app.prune()
+            except Exception as e:
+                debug('Could not remove old versions of %s: %s', app.name, e)
+
+        self._reap_trash()
+        result.seconds = round(time() - start_time, 3)
 
-        version_re = re.compile(app_spec.name + r'-(\d+\.\d+\.\d+(?:\.\w+\d+)?)\.')
+        return result
+
+    def bundle(self, name, version=None, output=None):
+        """
+        Create a bundle of an installed app version that can be installed on other hosts using :meth:`install_bundle`
+        without building it again. Hosts should have the same OS, architecture and Python version.
+
+        :param str name: Name of the app
+        :param str version: Installed version to bundle. Defaults to the current version.
+        :param Path output: Bundle file or directory to create it in. Defaults to current directory.
+        :return: Path of the bundle file
+        """
+        app = App(name, self.paths, debug=self.debug)
+
+        with app.lock():
+            if not app.is_installed:
+                raise exceptions.InvalidAction(f'{name} is not installed')
+
+            version = version or app.current_version
+            python_version = app.settings().get('python_version', PYTHON_VERSION)
+
+            bundle_file = Path(output or '.')
+            if bundle_file.is_dir():
+                bundle_file = bundle_file / f'{name}-{version}-py{python_version}.tar.gz'
+
+            app.bundle(version, bundle_file)
+
+        info(f'Bundled {name} {version} to {bundle_file}')
+
+        return bundle_file
+
+    def _app_version(self, app_spec, use_cache=False, python_version=None):
+        """
+        Get app version from PyPI
+
+        :param pkg_resources.Requirement app_spec: App version requirement
+        :param bool use_cache: Use versions previously read from PyPI for the same app
+        :param str python_version: Only consider versions that support this Python version per their Requires-Python
+        :return: Latest version matching the requirement that is not yanked, unless it is pinned exactly.
+        """
         versions = []
         matched_versions = []
-
-        for line in version_links.split('\n'):
-            match = version_re.search(line)
-            if match:
-                if match.group(1) in app_spec:
-                    matched_versions.append(match.group(1))
-                else:
-                    versions.append(match.group(1))
+        unsupported_versions = []
+        yanked_versions = []
+
+        # Only one version can match an exact pin, so stop reading versions once it is found
+        is_exact_pin = (len(app_spec.specs) == 1 and app_spec.specs[0][0] in ('==', '===')
+                        and not app_spec.specs[0][1].endswith('*'))
+
+        for version in self._app_versions(app_spec.name, use_cache=use_cache,
+                                          stop_at=app_spec if is_exact_pin else None):
+            requires_pythons, yanked = self._release_info[app_spec.name].get(version, ({''}, False))
+
+            if version not in app_spec:
+                versions.append(version)
+            elif yanked and not is_exact_pin:
+                yanked_versions.append(version)
+            elif python_version and not any(supports_python(r, python_version) for r in requires_pythons):
+                unsupported_versions.append(version)
+            else:
+                matched_versions.append(version)
 
         if not matched_versions:
-            if versions:
+            if unsupported_versions:
+                latest_version = sorted_versions(unsupported_versions)[-1]
+                requires_pythons = self._release_info[app_spec.name][latest_version][0]
+                requires_python = ' or '.join(sorted(filter(None, requires_pythons)))
+                raise ValueError(f'No version of {app_spec.name} matching {app_spec} supports Python {python_version}. '
+                                 f'The latest version, {latest_version}, requires Python {requires_python}. '
+                                 'Please specify a supported Python version using --python option.')
+            elif yanked_versions:
+                raise ValueError(f'All versions of {app_spec.name} matching {app_spec} were yanked: '
+                                 + ', '.join(sorted_versions(yanked_versions)))
+            elif versions:
                 raise ValueError(f'No app version matching {app_spec} \nAvailable versions: '
                                  + ', '.join(sorted_versions(versions)))
             else:
-                raise ValueError(f'No app version found in {pkg_index_url}')
+                raise ValueError(f'No app version found in {self._index_url + app_spec.name + "/"}')
 
         return sorted_versions(matched_versions)[-1]
 
+    def _app_versions(self, name, use_cache=False, stop_at=None):
+        """
+        Get all versions of the app from PyPI
+
+        :param str name: Name of the app
+        :param bool use_cache: Use versions previously read from PyPI for the same app
+        :param pkg_resources.Requirement stop_at: Stop reading versions once a version matching this is found
+        :return: List of unique versions in the order listed by PyPI
+        """
+        if use_cache and name in self._versions_cache:
+            return self._versions_cache[name]
+
+        pkg_index_url = self._index_url + name + '/'
+
+        if not self._index:
+            self._index = self._new_index()
+
+        version_re = re.compile(name + r'-(\d+\.\d+\.\d+(?:\.\w+\d+)?)\.')
+        requires_python_re = re.compile(r'data-requires-python="([^"]*)"')
+
+        def parse_versions(lines):
+            # Only keep unique versions as there are usually multiple files per version. Release info is collected
+            # per page as pages of several indexes may be read concurrently, and only the ones used are kept.
+            release_info = {}
+
+            for line in lines:
+                match = version_re.search(line)
+                if not match or 'href' not in line:
+                    continue
+
+                version = match.group(1)
+                requires_python = requires_python_re.search(line)
+                requires_python = html.unescape(requires_python.group(1)) if requires_python else ''
+                yanked = 'data-yanked' in line
+
+                if version in release_info:
+                    release_info[version][0].add(requires_python)
+                    release_info[version][1] = release_info[version][1] and yanked
+
+                else:
+                    release_info[version] = [{requires_python}, yanked]
+
+                    if stop_at and version in stop_at:
+                        break
+
+            return release_info
+
+        try:
+            release_info = self._index.lookup(name, parse_versions)
+            self._release_info[name].update(release_info)
+            versions = list(release_info)
+
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                raise NameError(f'{name} does not exist on {", ".join(c.index_url for c in self._index.clients)}')
+            else:
+                raise Exception(f'Failed to read from {pkg_index_url}: {e}')
+
+        if not stop_at:  # Versions may be partial otherwise
+            self._versions_cache[name] = versions
+
+        return versions
+
+    def _new_index(self, save_state=True):
+        """
+        Create the group of indexes to look up apps from
+
+        :param bool save_state: Save circuit breaker state of the indexes
+        """
+        state_file = self.paths.state_root / 'index.json'
+        return IndexGroup([IndexClient(url, auth=auth, state_file=state_file, save_state=save_state)
+                           for url, auth in [(self._index_url, self._index_auth)] + self._extra_indexes])
+
     def _set_index(self):
-        """ Set PyPI url and auth """
+        """ Set PyPI url and auth, and extra indexes to look up apps from """
         if not self._index_url:
-            for conf_file in ['~/.config/pip/pip.conf', '~/.pip/pip.conf', '/etc/pip.conf']:
+            conf_files = ['~/.config/pip/pip.conf', '~/.pip/pip.conf', '/etc/pip.conf']
+
+            for conf_file in conf_files:
                 self._index_url, self._index_auth = self._parse_pip_conf_for_index(conf_file)
                 if self._index_url:
                     break
@@ -168,6 +493,16 @@ class AppsManager:
             if not self._index_url:  # No need to check for login/password for this as everything is public
                 self._index_url = 'https://pypi.org/simple/'
 
+            for conf_file in conf_files:
+                self._extra_indexes = self._parse_pip_conf_for_extra_indexes(conf_file)
+                if self._extra_indexes:
+                    break
+
+            self._extra_indexes.extend(self._split_index_auth(url)
+                                       for url in os.environ.get(MIRRORS_ENV_VAR, '').split())
+            self._extra_indexes = [(url, auth or self._parse_netrc_credential_for(url))
+                                   for url, auth in self._extra_indexes if url != self._index_url]
+
     @staticmethod
     def _parse_pip_conf_for_index(conf_file):
         """
@@ -184,20 +519,53 @@ class AppsManager:
                 parser = RawConfigParser()
                 parser.read(pip_conf)
 
-                index_url = parser.get('global', 'index-url')
+                index_url, index_auth = AppsManager._split_index_auth(parser.get('global', 'index-url'))
+
+            except Exception:
+                pass
 
-                auth_re = re.compile('//([^:]+)(?::([^@]+))?@')
-                match = auth_re.search(index_url)
-                if match:
-                    index_auth = match.groups()
-                    index_url = auth_re.sub('//', index_url)
+        return index_url, index_auth
 
-                if not index_url.endswith('/'):
-                    index_url += '/'
+    @staticmethod
+    def _parse_pip_conf_for_extra_indexes(conf_file):
+        """
+        Parse the given pip.conf file for extra-index-url, which may have multiple URLs separated by whitespace
+
+        :param str pip_conf_path: Path to pip.conf file
+        :return: List of tuples of index_url and another tuple of user and password (or None)
+        """
+        pip_conf = Path(conf_file).expanduser()
+        if pip_conf.exists():
+            try:
+                parser = RawConfigParser()
+                parser.read(pip_conf)
+
+                return [AppsManager._split_index_auth(url) for url in parser.get('global', 'extra-index-url').split()]
 
             except Exception:
                 pass
 
+        return []
+
+    @staticmethod
+    def _split_index_auth(index_url):
+        """
+        Split user and password from the index URL
+
+        :param str index_url: URL of the index that may have user and password in it
+        :return: Tuple of index_url ending with / and another tuple of user and password (or None)
+        """
+        index_auth = None
+
+        auth_re = re.compile('//([^:]+)(?::([^@]+))?@')
+        match = auth_re.search(index_url)
+        if match:
+            index_auth = match.groups()
+            index_url = auth_re.sub('//', index_url)
+
+        if not index_url.endswith('/'):
+            index_url += '/'
+
         return index_url, index_auth
 
     @staticmethod
@@ -236,24 +604,21 @@ class AppsManager:
     @property
     def apps(self):
         """ Iterator for installed apps """
-        for app_path in sorted(self.paths.install_root.iterdir()):
-            if app_path in {self.paths.symlink_root, self.paths.log_root}:
-                continue
-
-            app = App(app_path.name, self.paths)
+        return _installed_apps(self.paths)
 
-            if app.is_installed:
-                yield app
-
-    def list(self, name_filter=False, scripts=False):
+    def list(self, name_filter=False, scripts=False, output_format='table'):
         """
         List installed apps
 
         :param str name_filter: Filter apps by name
         :param bool scripts: Show scripts
+        :param str output_format: Output format: table, json (array) or jsonl (one JSON object per line).
+                                  JSON formats are printed as soon as each app is read.
         """
+        if output_format in ('json', 'jsonl'):
+            return self._list_json(name_filter=name_filter, lines=output_format == 'jsonl')
+
         app_info = []
-        info_lens = defaultdict(int)
 
         for app in self.apps:
             if name_filter and name_filter not in app.name:
@@ -262,7 +627,8 @@ class AppsManager:
             app_path = str(app.current_path.resolve())
 
             if app.settings().get('update'):
-                update = f"[updates {app.settings()['update']}]"
+                adaptive = ', adaptive' if app.settings().get('adaptive_update') else ''
+                update = f"[updates {app.settings()['update']}{adaptive}]"
             else:
                 update = ''
 
@@ -281,15 +647,7 @@ class AppsManager:
                         hide_path = True
 
         if app_info:
-            # Figure out max length of each column
-            for info_part in app_info:
-                for i, value in enumerate(info_part):
-                    info_lens[i] = len(value) if len(value) > info_lens[i] else info_lens[i]
-
-            # Print table
-            table_style = '  '.join('{{:{}}}'.format(lens) if lens else '{}' for lens in info_lens.values())
-            for info_part in app_info:
-                info(table_style.format(*info_part))
+            _print_table(app_info)
 
         elif name_filter:
             info(f'No apps matching "{name_filter}"')
@@ -302,60 +660,504 @@ class AppsManager:
                     and autopip_path.startswith(str(self.paths.SYSTEM_SYMLINK_ROOT))):
                 info('To see apps installed in %s, re-run using sudo.', self.paths.SYSTEM_INSTALL_ROOT)
 
+    def _list_json(self, name_filter=False, lines=False):
+        """
+        Print installed apps as JSON without running any subprocesses
+
+        :param str name_filter: Filter apps by name
+        :param bool lines: Print one JSON object per line instead of a JSON array
+        """
+        first = True
+
+        if not lines:
+            print('[', flush=True)
+
+        for app in self.apps:
+            if name_filter and name_filter not in app.name:
+                continue
+
+            app_info = app.info()
+
+            if lines:
+                print(json.dumps(app_info), flush=True)
+            else:
+                print(('  ' if first else ', ') + json.dumps(app_info), flush=True)
+            first = False
+
+        if not lines:
+            print(']', flush=True)
+
+    def plan(self, apps=None, as_json=False):
+        """
+        Show what an update from cron would do without building or changing anything
+
+        :param list apps: List of apps to plan for. Defaults to all.
+        :param bool as_json: Print the plan as JSON
+        :return: Dict with list of actions, dependency cycles from "autopip" entry points, and estimated seconds
+        """
+        self._set_index()
+        self._index = self._new_index(save_state=False)  # Plan does not change anything on disk
+
+        app_specs = [(a.settings().get('app_spec', a.name), a.settings().get('update'))
+                     for a in self.apps if not apps or a.name in apps]
+        actions = []
+        dependencies = {}
+        planned = set()
+
+        while app_specs:
+            spec, update = app_specs.pop(0)
+            app_spec = next(iter(pkg_resources.parse_requirements(spec)))
+
+            if app_spec.name in planned:
+                continue
+            planned.add(app_spec.name)
+
+            app = App(app_spec.name, self.paths, debug=self.debug)
+            action = {'app': app.name, 'spec': str(app_spec), 'current_version': app.current_version,
+                      'target_version': None, 'action': 'skip', 'reason': '', 'estimated_seconds': 0}
+            actions.append(action)
+
+            if app.is_installed:
+                group_specs = app.group_specs()
+                dependencies[app.name] = [next(iter(pkg_resources.parse_requirements(s))).name
+                                          for s, _ in group_specs]
+
+                if not update:
+                    action['reason'] = 'auto-update is disabled'
+                    continue
+
+                update = UpdateFreq.from_name(update)
+                if not app.update_due(update):
+                    next_update = datetime.fromtimestamp(app.next_update_at(update))
+                    action['reason'] = f'not due until {next_update:%Y-%m-%d %H:%M}'
+                    continue
+
+            else:
+                group_specs = []
+
+            try:
+                python_version = app.settings().get('python_version') or PYTHON_VERSION
+                version = action['target_version'] = self._app_version(app_spec, use_cache=True,
+                                                                       python_version=python_version)
+
+            except Exception as e:
+                action.update(action='error', reason=str(e).split('\n')[0])
+                continue
+
+            failed_at = app.failed_build(version, python_version)
+            deferred_at = app.settings().get('deferred_at')
+
+            if version == app.current_version:
+                action['reason'] = 'up-to-date'
+
+            elif failed_at:
+                action['reason'] = f'failed to install at {failed_at:%Y-%m-%d %H:%M}'
+
+            else:
+                action['action'] = 'upgrade' if app.is_installed else 'install'
+
+                if (app.path / version).exists():
+                    action.update(reason='previously installed', estimated_seconds=1)
+                else:
+                    action['estimated_seconds'] = app.settings().get('build_seconds', App.DEFAULT_BUILD_SECONDS)
+
+                if deferred_at:
+                    action['reason'] = ', '.join(filter(None, [
+                        action['reason'], f'deferred since {datetime.fromtimestamp(deferred_at):%Y-%m-%d %H:%M}']))
+
+                # Group members are installed / updated along with the app
+                app_specs.extend(group_specs)
+
+        plan = {'actions': actions, 'cycles': find_cycles(dependencies),
+                'estimated_seconds': sum(a['estimated_seconds'] for a in actions)}
+
+        if as_json:
+            print(json.dumps(plan, indent=2))
+
+        else:
+            rows = []
+            for action in actions:
+                versions = [action['current_version']]
+                if action['action'] in ('install', 'upgrade'):
+                    versions.append(action['target_version'])
+                cost = f"~{action['estimated_seconds']}s" if action['estimated_seconds'] else ''
+
+                rows.append((action['app'], ' -> '.join(filter(None, versions)), action['action'], action['reason'],
+                             cost))
+            _print_table(rows)
+
+            for cycle in plan['cycles']:
+                info('! Circular "autopip" entry points: %s', ' -> '.join(cycle))
+
+            info(f"Estimated time: ~{plan['estimated_seconds']}s")
+
+        return plan
+
+    def base(self, requirements=None, python_version=PYTHON_VERSION, backend=None):
+        """
+        Build or refresh the shared base layer of common packages for the Python version. Apps installed with the base
+        option inherit packages from the layer and only install packages that are not in it or are needed at other
+        versions. Refreshing builds a new layer with the latest versions that apps use from their next build.
+
+        :param list[str] requirements: Requirements of the layer, such as ['requests', 'pyyaml']. Defaults to the
+                                       requirements of the current layer to refresh it.
+        :param str python_version: Python version of the layer
+        :param str backend: Name of the installer backend to build the layer with
+        :return: True if a new layer was built
+        """
+        layer = BaseLayer(self.paths, python_version)
+
+        with file_lock(self.paths.lock_root / f'base-{python_version}.lock',
+                       wait_msg='Waiting for another autopip process to finish with the shared base layer'):
+            built = layer.build(get_backend(backend), requirements)
+
+        if built:
+            apps = [a.name for a in self.apps if a.settings().get('base')]
+            if apps:
+                info('Apps will use the new layer from their next update: %s', ', '.join(apps))
+
+        self._collect_base_layers()
+
+        return built
+
+    def _collect_base_layers(self):
+        """ Remove shared base layers that are no longer used """
+        base_root = self.paths.install_root / '.base'
+        if self._defer_cleanup or not base_root.exists():
+            return
+
+        for python_path in base_root.iterdir():
+            try:
+                BaseLayer(self.paths, python_path.name).collect_garbage()
+            except Exception as e:
+                debug('Could not remove unused shared base layers in %s: %s', python_path, e)
+
+    def _reap_trash(self):
+        """
+        Remove uninstalled apps and old versions in the trash in the background, and then files in the content store
+        that only they used. Trash left by a reap that did not finish, such as after a crash, is also removed.
+        """
+        if self._defer_cleanup:
+            return
+
+        try:
+            if has_trash(self.paths.trash_root):
+                reap_in_background(self.paths.trash_root, self.paths.store_root)
+        except Exception as e:
+            debug('Could not start reaping %s: %s', self.paths.trash_root, e)
+
+    def dedupe(self, apps=None):
+        """
+        Hardlink identical files across installed app versions to a shared content store to save disk space
+
+        :param list apps: List of apps to dedupe. Defaults to all.
+        """
+        version_paths = [p for a in self.apps if not apps or a.name in apps
+                         for p in a.path.iterdir() if p.is_dir() and not p.is_symlink()]
+
+        deduped, saved = dedupe(version_paths, self.paths.store_root)
+        removed = collect_garbage(self.paths.store_root)
+
+        info('Deduped %s files and saved %.1f MB', deduped, saved / 1024 / 1024)
+        if removed:
+            debug('Removed %s unused files from %s', removed, self.paths.store_root)
+
+    def doctor(self, fix=False):
+        """
+        Check that script symlinks match the scripts of installed apps, such as missing or dangling symlinks and
+        symlinks left over from crashed installs.
+
+        :param bool fix: Create, update or remove symlinks to fix the issues found
+        :return: List of :cls:`LinkChange` for the issues found
+        """
+        with self.paths.global_lock():
+            changes = _plan_links(self.paths)
+
+            if fix:
+                apply_links(self.paths.symlink_root, changes)
+
+        if not changes:
+            info('No issues found with script symlinks in %s', self.paths.symlink_root)
+            return changes
+
+        info('Found %s issue(s) with script symlinks in %s', len(changes), self.paths.symlink_root)
+        for change in changes:
+            if change.action == 'conflict':
+                info(f'! {change.name} ({change.reason})')
+            else:
+                info(f'{"-" if change.action == "remove" else "+"} {change.name} ({change.reason})')
+
+        fixable = [c for c in changes if c.action != 'conflict']
+        if fix and fixable:
+            info('Fixed %s issue(s)', len(fixable))
+        elif fixable:
+            info('To fix, re-run with --fix')
+
+        return changes
+
+    def apply(self, state_file, prune=False, jobs=4):
+        """
+        Install, upgrade or uninstall apps so installed apps match the desired state in the given file.
+        Apps that already match are not checked, so applying an unchanged state is near-instant.
+
+        :param Path state_file: TOML or JSON file with list of apps, where each app has "spec" and optionally "update"
+                                and "python" keys. E.g. {"apps": [{"spec": "bumper", "update": "daily"}]}
+        :param bool prune: Uninstall apps that are not in the desired state
+        :param int jobs: Number of apps to change concurrently
+        """
+        desired_apps = self._load_state(state_file)
+        installed_apps = {a.name: a for a in self.apps}
+        changes = []
+
+        for spec, update, python_version in desired_apps:
+            app_spec = next(iter(pkg_resources.parse_requirements(spec)))
+            app = installed_apps.get(app_spec.name)
+
+            if not app:
+                changes.append(('install', app_spec.name, (spec, update, python_version)))
+                continue
+
+            settings = app.settings()
+            desired_update = None if App.is_pinned(app_spec) else update
+
+            if (settings.get('app_spec', app.name) != str(app_spec) or app.current_version not in app_spec
+                    or (settings.get('update') or None) != desired_update
+                    or python_version and settings.get('python_version') != python_version):
+                changes.append(('upgrade', app_spec.name, (spec, update, python_version)))
+
+        if prune:
+            desired_names = {next(iter(pkg_resources.parse_requirements(s))).name for s, _, _ in desired_apps}
+            changes.extend(('uninstall', name, None) for name in sorted(installed_apps)
+                           if name not in desired_names and name != 'autopip')
+
+        if not changes:
+            info('All apps are already in the desired state')
+            return
+
+        def change(action, name, desired):
+            # Each worker uses its own manager as the index client and version caches are not thread-safe
+            manager = AppsManager(debug=self.debug)
+            manager._defer_cleanup = True
+
+            if action == 'uninstall':
+                manager.uninstall([name])
+
+            else:
+                spec, update, python_version = desired
+                manager.install([spec], update=update and UpdateFreq.from_name(update),
+                                python_version=python_version, force=True)
+
+                app = App(name, self.paths)
+                if not update and app.settings().get('update'):
+                    app.settings(update=None)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(change, *c): c for c in changes}
+
+        self._collect_base_layers()
+        self._reap_trash()
+
+        failed = []
+        applied = []
+        for future, (action, name, _) in futures.items():
+            if future.exception():
+                if str(future.exception()):
+                    error('! Failed to %s %s: %s', action, name, future.exception())
+                failed.append(name)
+            else:
+                applied.append(action)
+
+        info('Applied desired state: %s', ', '.join(
+            f'{applied.count(action)} {done}'
+            for action, done in [('install', 'installed'), ('upgrade', 'upgraded'), ('uninstall', 'uninstalled')]))
+
+        if failed:
+            raise exceptions.FailedAction()
+
+    @staticmethod
+    def _load_state(state_file):
+        """
+        Load desired state of apps from the given TOML or JSON file
+
+        :param Path state_file: File to load
+        :return: List of tuples of app spec, update frequency and python version
+        """
+        if state_file.suffix == '.toml':
+            try:
+                import tomllib
+            except ImportError:
+                raise exceptions.MissingError('TOML requires Python 3.11+. Please use a JSON file instead.')
+
+            with state_file.open('rb') as fp:
+                state = tomllib.load(fp)
+
+        else:
+            with state_file.open() as fp:
+                state = json.load(fp)
+
+        apps = state.get('apps', []) if isinstance(state, dict) else state
+        desired_apps = []
+
+        for app in apps:
+            if isinstance(app, str):
+                app = {'spec': app}
+
+            update = app.get('update')
+            if update:
+                UpdateFreq.from_name(update)  # Validate
+
+            desired_apps.append((app['spec'], update and update.lower(), app.get('python')))
+
+        return desired_apps
+
+    def activate(self, apps=None):
+        """
+        Activate staged versions now regardless of their activation window
+
+        :param list apps: List of apps to activate. Defaults to all.
+        """
+        self._activate_staged([a for a in self.apps if not apps or a.name in apps], force=True)
+
+    def _activate_staged(self, apps, force=False):
+        """
+        Activate staged versions of the given apps
+
+        :param list[App] apps: Apps to activate
+        :param bool force: Activate even if outside of the activation window
+        """
+        activated = False
+
+        for app in apps:
+            with app.lock():
+                version = app.staged_version
+                if version and (force or app.can_activate_staged):
+                    info(f'Activating {app.name} {version}')
+                    app.activate(version)
+                    activated = True
+
+        if not activated and force:
+            info('No staged versions to activate')
+
+    def rollback(self, name, version=None):
+        """
+        Switch an app back to a previously installed version
+
+        :param str name: Name of the app
+        :param str version: Version to switch to. Defaults to the version before the current one.
+        :return: :cls:`ActionResult` for the app
+        """
+        app = App(name, self.paths, debug=self.debug)
+        start_time = time()
+
+        with app.lock():
+            if not app.is_installed:
+                raise exceptions.InvalidAction(f'{name} is not installed')
+
+            result = ActionResult(name, old_version=app.current_version)
+            old_scripts = app.current_scripts()
+
+            app.rollback(version)
+
+            result.new_version = app.current_version
+            if result.new_version != result.old_version:
+                result.action = 'rollback'
+                result.set_scripts(old_scripts, app.current_scripts())
+            result.seconds = round(time() - start_time, 3)
+
+        return result
+
     def uninstall(self, apps):
-        """ Uninstall apps """
+        """
+        Uninstall apps
+
+        :param list[str] apps: List of apps to uninstall
+        :return: List of :cls:`ActionResult` for the apps
+        """
+        results = []
+
         for name in apps:
             if name == 'autopip' and len(list(self.apps)) > 1:
                 if apps[-1] == 'autopip':
                     error('! autopip can not be uninstalled until other apps are uninstalled: %s', ' '.join(
                         a.name for a in self.apps if a.name != 'autopip'))
+                    results.append(ActionResult(name, action='error', error='Other apps are still installed'))
                 else:  # Try again after uninstall the other apps
                     apps.append('autopip')
 
                 continue
 
             app = App(name, self.paths)
-            if app.is_installed:
-                group_specs = app.group_specs(name_only=True)
-                app.uninstall()
+            start_time = time()
+            with app.lock():
+                if app.is_installed:
+                    result = ActionResult(name, action='uninstall', old_version=app.current_version)
+                    result.set_scripts(app.current_scripts(), set())
+                    group_specs = app.group_specs(name_only=True)
+                    app.uninstall()
+                    result.seconds = round(time() - start_time, 3)
+                    results.append(result)
 
-                if group_specs:
-                    info('This app has defined "autopip" entry points to uninstall: %s', ' '.join(group_specs))
-                    apps.extend(group_specs)
+                    if group_specs:
+                        info('This app has defined "autopip" entry points to uninstall: %s', ' '.join(group_specs))
+                        apps.extend(group_specs)
 
-            else:
-                info(f'{name} is not installed')
+                else:
+                    info(f'{name} is not installed')
+                    results.append(ActionResult(name))
+
+        self._collect_base_layers()
+        self._reap_trash()
 
         if not list(self.apps):
             try:
-                crontab.remove('autopip')
+                with self.paths.global_lock():
+                    crontab.remove('autopip')
             except Exception as e:
                 debug('Could not remove crontab for autopip: %s', e)
 
-    def update(self, apps=None, wait=False):
+        return results
+
+    def update(self, apps=None, wait=False, stage=False, force=False, raise_on_failure=True, max_time=None,
+               max_builds=None):
         """
         Update installed apps
 
         :param list apps: List of apps to update. Defaults to all.
         :param bool wait: Wait for a new version to be published and then install it.
+        :param bool stage: Build new versions with low priority ahead of time and activate them per their activation
+                           window, or later using activate command.
+        :param bool force: Check for new versions of all apps even if they are not due for an update
+        :param bool raise_on_failure: Raise :cls:`exceptions.FailedAction` if any app failed to update
+        :param int max_time: Max seconds to spend. Apps left are deferred to the next run.
+        :param int max_builds: Max number of apps to update. Apps left are deferred to the next run.
+        :return: List of :cls:`ActionResult` for the apps
         """
+        results = []
         app_instances = list([a for a in self.apps if a.name in apps] if apps else self.apps)
 
         if app_instances:
+            self._activate_staged(app_instances)
+
+            # Most overdue apps first so they are not starved by the budget, and apps that failed last time go last
+            if max_time or max_builds is not None or not sys.stdout.isatty():
+                app_instances.sort(key=self._update_priority)
+
             app_specs = []
             for app in app_instances:
                 settings = app.settings()
                 if settings.get('update'):
                     app_specs.append((settings['app_spec'], settings['update']))
-                elif sys.stdout.isatty() or wait:
+                elif sys.stdout.isatty() or wait or force:
                     app_specs.append((settings.get('app_spec', app.name), None))
 
             if app_specs:
-                self.install(app_specs, wait=wait)
+                results = self.install(app_specs, wait=wait, stage=stage, force=force,
+                                       raise_on_failure=raise_on_failure, max_time=max_time, max_builds=max_builds)
 
             elif not apps:
                 try:
-                    crontab.remove('autopip')
+                    with self.paths.global_lock():
+                        crontab.remove('autopip')
                 except Exception as e:
                     debug('Could not remove crontab for autopip: %s', e)
 
@@ -366,6 +1168,18 @@ class AppsManager:
         else:
             info('No apps installed yet.')
 
+        return results
+
+    @staticmethod
+    def _update_priority(app):
+        """ Sort key to update apps by: apps without a failure in the last update go first, then earliest due """
+        settings = app.settings()
+        update = settings.get('update')
+        due_at = settings.get('deferred_at') or (
+            app.next_update_at(UpdateFreq.from_name(update), settings) if update else app.path.stat().st_mtime)
+
+        return bool(settings.get('last_failure')), due_at
+
 
 class App:
     """ Represents an app that may or may not be installed on disk """
@@ -373,6 +1187,21 @@ class App:
     #: Prefixes of scripts to skip when creating symlinks
     SKIP_SCRIPT_PREFIXES = {'activate', 'pip', 'easy_install', 'python', 'wheel'}
 
+    #: Number of versions to keep installed for rollback (current and previous version) unless set per app
+    DEFAULT_KEEP_VERSIONS = 2
+
+    #: Estimated seconds to build a version when the app was not built before
+    DEFAULT_BUILD_SECONDS = 60
+
+    #: Seconds to skip a version that failed to install from cron before trying it again
+    FAILED_BUILD_RETRY_SECONDS = UpdateFreq.WEEKLY.seconds
+
+    #: Number of update checks per expected release interval for apps with adaptive update
+    ADAPTIVE_CHECKS_PER_RELEASE = 10
+
+    #: Number of recent release times to keep for apps with adaptive update
+    RELEASE_HISTORY_SIZE = 10
+
     def __init__(self, name, paths, debug=False):
         """
         :param str name: Name of the app
@@ -395,6 +1224,11 @@ class App:
     def __repr__(self):
         return f"App('{self.name}')"
 
+    def lock(self):
+        """ Lock to prevent other autopip processes from changing this app at the same time """
+        return file_lock(self.paths.lock_root / f'{self.name}.lock',
+                         wait_msg=f'Waiting for another autopip process to finish with {self.name}')
+
     @property
     def is_installed(self):
         """ Is the app installed? """
@@ -411,7 +1245,82 @@ class App:
         if self.current_path:
             return self.current_path.resolve().name
 
-    def install(self, version, app_spec, update=None, python_version=None):
+    @property
+    def versions(self):
+        """ Sorted list of installed versions """
+        if not self.path.exists():
+            return []
+
+        return sorted_versions([p.name for p in self.path.iterdir()
+                                if p.is_dir() and not p.is_symlink() and not p.name.startswith('.')])
+
+    @staticmethod
+    def is_pinned(app_spec):
+        """ True if the app spec pins to a specific version, which disables auto-update """
+        return '==' in str(app_spec) and not str(app_spec).endswith('*')
+
+    def update_due(self, update):
+        """
+        Check if the app was not installed or updated within the update frequency
+
+        :param UpdateFreq update: How often to update
+        """
+        # Deferred apps were due in a previous update run
+        return bool(self.settings().get('deferred_at')) or self.next_update_at(update) < time()
+
+    def next_update_at(self, update, settings=None):
+        """
+        Time when the app is due for the next update check
+
+        :param UpdateFreq update: How often to update
+        :param dict settings: Settings of the app if already loaded
+        """
+        return self.path.stat().st_mtime + self.update_interval(update, settings)
+
+    def update_interval(self, update, settings=None):
+        """
+        Seconds between update checks. With adaptive update, the interval is a fraction of how long the app has gone
+        without a release, capped by its typical time between releases, so rarely released apps are checked less often
+        and apps that just released are checked at the update frequency again.
+
+        :param UpdateFreq update: How often to update, which is the shortest interval
+        :param dict settings: Settings of the app if already loaded
+        :return: Seconds between update checks from update frequency up to monthly
+        """
+        settings = settings or self.settings()
+        tracked_at = settings.get('release_tracked_at')
+        if not settings.get('adaptive_update') or tracked_at is None:
+            return update.seconds
+
+        releases = settings.get('release_history', [])
+        quiet_seconds = time() - max(releases[-1:] + [tracked_at])
+
+        release_gaps = sorted(b - a for a, b in zip(releases, releases[1:]))
+        if release_gaps:
+            quiet_seconds = min(quiet_seconds, release_gaps[len(release_gaps) // 2])
+
+        return int(min(max(quiet_seconds / self.ADAPTIVE_CHECKS_PER_RELEASE, update.seconds),
+                       max(UpdateFreq.MONTHLY.seconds, update.seconds)))
+
+    def record_release(self, latest_version):
+        """
+        Record when a new latest version was first seen on the index to learn how often the app is released
+
+        :param str latest_version: Latest version of the app per its spec
+        """
+        settings = self.settings()
+        if settings.get('latest_version') == latest_version:
+            return
+
+        releases = settings.get('release_history', [])
+        if settings.get('latest_version'):
+            releases = (releases + [round(time())])[-self.RELEASE_HISTORY_SIZE:]
+
+        self.settings(latest_version=latest_version, release_history=releases,
+                      release_tracked_at=settings.get('release_tracked_at', round(time())))
+
+    def install(self, version, app_spec, update=None, python_version=None, keep_versions=None, backend=None,
+                lock_file=None, bundle_file=None, launcher=None, base=None):
         """
         Install the version of the app if it is not already installed
 
@@ -419,11 +1328,15 @@ class App:
         :param pkg_resources.Requirement app_spec: App version requirement from user
         :param UpdateFreq|None update: How often to update. Choose from hourly, daily, weekly, monthly
         :param str python_version: Python version to run app
+        :param int keep_versions: Number of versions to keep installed for rollback, including the current version.
+        :param str backend: Name of the installer backend to use for this app
+        :param Path lock_file: Lock file to install exact dependencies from
+        :param Path bundle_file: Bundle created by :meth:`bundle` to extract the version from instead of building it
+        :param str launcher: How to launch scripts of the app. One of :data:`autopip.shims.LAUNCHERS`.
+        :param bool base: Inherit common packages from the shared base layer of the Python version
         :return: True if install or update happened, otherwise False when nothing happened (already installed / non-tty)
         """
         version_path = self.path / version
-        prev_version_path = self.current_path and self.current_path.resolve()
-        important_paths = [version_path, prev_version_path, self._current_symlink]
 
         if self.settings():
             if not python_version:
@@ -435,10 +1348,14 @@ class App:
         if not python_version:
             python_version = PYTHON_VERSION
 
-        if version_path.exists():
+        built_python_version = self.built_python_version(version)
+        rebuild = built_python_version not in (None, python_version)
+
+        if version_path.exists() and not rebuild:
             if self.current_version == version:
-                # Skip printing / ensuring symlinks / cronjob when running from cron
-                if not sys.stdout.isatty():
+                # Skip printing / ensuring symlinks / cronjob when running from cron unless settings are changed
+                if (not sys.stdout.isatty() and launcher in (None, self.settings().get('launcher', 'symlink'))
+                        and (not update or update.name.lower() == self.settings().get('update'))):
                     return False
 
                 pinned = str(app_spec).lstrip(self.name)
@@ -449,72 +1366,29 @@ class App:
             else:
                 info(f'{self.name} {version} was previously installed and will be set as the current version')
 
-        else:
-            if not shutil.which('python' + python_version):
-                error(f'! python{python_version} does not exist. '
-                      'Please install it first, or ensure its path is in PATH.')
-                sys.exit(1)
-
-            venv = f'python{python_version} -m venv'
-
-            old_venv_dir = None
-            old_path = None
-            no_compile = '--no-compile ' if os.getuid() else ''
+        elif bundle_file:
+            self.unbundle(bundle_file)
 
-            info(f'Installing {self.name} to {version_path}')
-
-            os.environ.pop('PYTHONPATH', None)
-            if 'VIRTUAL_ENV' in os.environ:
-                old_venv_dir = os.environ.pop('VIRTUAL_ENV')
-                old_path = os.environ['PATH']
-                os.environ['PATH'] = os.pathsep.join([p for p in os.environ['PATH'].split(os.pathsep)
-                                                      if os.path.exists(p) and not p.startswith(old_venv_dir)])
+        elif rebuild:
+            info(f'Rebuilding {self.name} {version} as it uses Python {built_python_version} instead of '
+                 f'{python_version}')
+            old_version_path = version_path.with_name(f'.{version}.{os.getpid()}')
+            version_path.rename(old_version_path)
 
             try:
-                run(f"""set -e
-                    {venv} {version_path}
-                    source {version_path / 'bin' / 'activate'}
-                    pip install --upgrade pip wheel
-                    pip install {no_compile}{self.name}=={version}
-                    """, executable='/bin/bash', stderr=STDOUT, shell=True)
-
-            except BaseException as e:
-                shutil.rmtree(version_path, ignore_errors=True)
-
-                if isinstance(e, CalledProcessError):
-                    if e.output:
-                        output = e.output.decode('utf-8')
-                        info(re.sub(r'(https?://)[^/]+:[^/]+@', r'\1<xxx>:<xxx>@', output))
-
-                    error(f'! Failed to install using Python {python_version}.'
-                          ' If this app requires a different Python version, please specify it using --python option.')
+                self.build(version, python_version, backend=backend, lock_file=lock_file, base=base)
 
+            except BaseException:
+                shutil.rmtree(version_path, ignore_errors=True)
+                old_version_path.rename(version_path)
                 raise
 
-            finally:
-                if old_venv_dir:
-                    os.environ['VIRTUAL_ENV'] = old_venv_dir
-                    os.environ['PATH'] = old_path
-
-            try:
-                shutil.rmtree(version_path / 'share' / 'python-wheels', ignore_errors=True)
-                run(f"""set -e
-                    source {version_path / 'bin' / 'activate'}
-                    pip uninstall --yes pip
-                    """, executable='/bin/bash', stderr=STDOUT, shell=True)
-
-            except Exception as e:
-                debug('Could not remove unnecessary packages/files: %s', e)
+            trash(old_version_path, self.paths.trash_root)
 
-        # Update current symlink
-        if not self.current_path or self.current_path.resolve() != version_path:
-            atomic_symlink = self.path / f'atomic_symlink_for_{self.name}'
-            atomic_symlink.symlink_to(version_path)
-            atomic_symlink.replace(self._current_symlink)
+        else:
+            self.build(version, python_version, backend=backend, lock_file=lock_file, base=base)
 
-            # Remove older versions
-            for path in [p for p in self.path.iterdir() if p not in important_paths]:
-                shutil.rmtree(path, ignore_errors=True)
+        self._set_current(version_path)
 
         current_scripts = self.scripts()
 
@@ -527,11 +1401,18 @@ class App:
                 '  See http://setuptools.readthedocs.io/en/latest/setuptools.html#automatic-script-creation')
 
         self.settings(app_spec=str(app_spec), python_version=python_version)
+        if keep_versions:
+            self.settings(keep_versions=keep_versions)
+        if backend:
+            self.settings(backend=backend)
+        if launcher:
+            self.settings(launcher=launcher)
+        if base is not None:
+            self.settings(base=base)
 
         # Install cronjobs
         if 'update' not in sys.argv:
-            pinning = '==' in str(app_spec) and not str(app_spec).endswith('*')
-            if pinning and (self.settings().get('update') or update):
+            if self.is_pinned(app_spec) and (self.settings().get('update') or update):
                 info('Auto-update will be disabled since we are pinning to a specific version.')
                 info('To enable, re-run without pinning to specific version with --update option')
 
@@ -545,25 +1426,27 @@ class App:
                         raise exceptions.MissingError(
                             'autopip is not available. Please make sure its bin folder is in PATH env var')
 
-                    # Migrate old crontabs
-                    try:
-                        old_crons = [c for c in crontab.list_entries().split('\n') if c and 'autopip update' not in c]
-                        if old_crons:
-                            cron_re = re.compile('autopip install "(.+)"')
-                            for cron in old_crons:
-                                match = cron_re.search(cron)
-                                if match:
-                                    old_app_spec = next(iter(pkg_resources.parse_requirements(match.group(1))))
-                                    old_app = App(old_app_spec.name, self.paths)
-                                    if old_app.is_installed:
-                                        old_app.settings(app_spec=str(old_app_spec))
-                            crontab.remove('autopip')
-
-                    except Exception as e:
-                        debug('Could not migrate old crontabs: %s', e)
-
-                    crontab.add(f'{autopip_path} update '
-                                f'2>&1 >> {self.paths.log_root / "cron.log"}', cmd_id='autopip update')
+                    with self.paths.global_lock():
+                        # Migrate old crontabs
+                        try:
+                            old_crons = [c for c in crontab.list_entries().split('\n')
+                                         if c and 'autopip update' not in c]
+                            if old_crons:
+                                cron_re = re.compile('autopip install "(.+)"')
+                                for cron in old_crons:
+                                    match = cron_re.search(cron)
+                                    if match:
+                                        old_app_spec = next(iter(pkg_resources.parse_requirements(match.group(1))))
+                                        old_app = App(old_app_spec.name, self.paths)
+                                        if old_app.is_installed:
+                                            old_app.settings(app_spec=str(old_app_spec))
+                                crontab.remove('autopip')
+
+                        except Exception as e:
+                            debug('Could not migrate old crontabs: %s', e)
+
+                        crontab.add(f'{autopip_path} update '
+                                    f'2>&1 >> {self.paths.log_root / "cron.log"}', cmd_id='autopip update')
                     info(update.name.title() + ' auto-update enabled via cron service')
 
                     self.settings(update=update.name.lower())
@@ -571,79 +1454,475 @@ class App:
                 except Exception as e:
                     error('! Auto-update was not enabled because: %s', e, exc_info=self.debug)
 
-        # Install script symlinks
-        prev_scripts = self.scripts(prev_version_path) if prev_version_path else set()
-        old_scripts = prev_scripts - current_scripts
+        printed_updating = self._link_scripts()
 
-        printed_updating = False
+        if not printed_updating and sys.stdout.isatty() and current_scripts and 'update' not in sys.argv:
+            info('Scripts are in {}: {}'.format(self.paths.symlink_root, ', '.join(sorted(current_scripts))))
 
-        for script in sorted(current_scripts):
-            script_symlink = self.paths.symlink_root / script
-            script_path = self.current_path / 'bin' / script
+        # Remove pyc for non-root installs for all versions, not just current.
+        if os.getuid():
+            try:
+                for pyc_file in self.path.rglob('*.pyc'):
+                    pyc_file.unlink()
+            except Exception as e:
+                debug('Could not remove *.pyc files: %s', e)
 
-            if script_symlink.resolve() == script_path.resolve():
-                continue
+        return True
 
-            if not printed_updating:
-                info('Updating script symlinks in {}'.format(self.paths.symlink_root))
-                printed_updating = True
+    def built_python_version(self, version):
+        """ Python version that the installed version was built with, or None if it is not installed or unknown """
+        lib_python = next(iter((self.path / version).glob('lib/python*')), None)
+        return lib_python and lib_python.name[len('python'):]
 
-            if script_symlink.exists():
-                if self.paths.covers(script_symlink) or self.name == 'autopip':
-                    atomic_symlink = self.paths.symlink_root / f'atomic_symlink_for_{self.name}'
-                    atomic_symlink.symlink_to(script_path)
-                    atomic_symlink.replace(script_symlink)
-                    info('* {} (updated)'.format(script_symlink.name))
+    def build(self, version, python_version, action='Installing', backend=None, lock_file=None, base=None):
+        """
+        Build the version of the app in its own virtual environment without making it the current version
 
-                else:
-                    info('! {} (can not change / not managed by autopip)'.format(script_symlink.name))
+        :param str version: Version of the app to build
+        :param str python_version: Python version to run app
+        :param str action: Action to show in the message
+        :param str backend: Name of the installer backend to use. Defaults to the one used by the app or host default.
+        :param Path lock_file: Lock file to install exact dependencies from without resolving them.
+                               Defaults to the lock file saved from a previous install of the version.
+        :param bool base: Inherit common packages from the shared base layer of the Python version instead of
+                          installing them. Defaults to the setting of the app.
+        """
+        version_path = self.path / version
+        base = self.settings().get('base') if base is None else base
+        layer = layer_path = None
+        saved_lock_file = self.lock_file(version)
+        lock_file = lock_file or (saved_lock_file if saved_lock_file.exists() else None)
+        locked_python = lock_file and locked_python_version(lock_file)
+        if locked_python and locked_python != python_version:
+            info(f'Not installing from lock file {lock_file} as it is for Python {locked_python}, so resolving '
+                 'dependencies instead')
+            lock_file = None
+        report_file = self.path / f'.install-report-{version}.json'
+        no_compile = bool(os.getuid())
+        locked = False
+        start_time = time()
+
+        if not shutil.which('python' + python_version):
+            raise exceptions.MissingError(f'python{python_version} does not exist. '
+                                          'Please install it first, or ensure its path is in PATH.')
+
+        installer = get_backend(backend or self.settings().get('backend'))
+
+        info(f'{action} {self.name} to {version_path}')
+
+        try:
+            installer.create_env(version_path, python_version)
+
+            if base:
+                layer = BaseLayer(self.paths, python_version)
+                layer_path = layer.link(version_path)
+                if not layer_path:
+                    info(f'No shared base layer for Python {python_version} yet, so installing all dependencies in the '
+                         'app. To create it, use "autopip base <packages>".')
+                    layer = None
+
+            if lock_file:
+                try:
+                    installer.install_locked(version_path, lock_file, no_compile=no_compile)
+                    locked = True
+
+                except CalledProcessError as e:
+                    info(f'Could not install from lock file {lock_file}, so resolving dependencies instead')
+                    debug(e.output and e.output.decode('utf-8'))
+
+            if not locked and layer:
+                try:
+                    # Lock file is written from installed packages that are not inherited from the layer instead
+                    installer.install(version_path, [f'{self.name}=={version}'], no_compile=no_compile)
+
+                except CalledProcessError as e:
+                    info(f'Could not install {self.name} on top of the shared base layer, so installing all '
+                         'dependencies in the app instead')
+                    debug(e.output and e.output.decode('utf-8'))
+                    layer = None
+                    shutil.rmtree(version_path)
+                    installer.create_env(version_path, python_version)
+
+            if not locked and not layer:
+                installer.install(version_path, [f'{self.name}=={version}'], no_compile=no_compile,
+                                  report_file=report_file)
+
+            if layer:
+                shadowed = layer.shadowed(version_path, layer_path)
+                if shadowed:
+                    info(f'Using own copies of {", ".join(f"{n}=={v}" for n, v in sorted(shadowed.items()))} as '
+                         f'{self.name} requires versions that differ from the shared base layer')
+
+        except BaseException as e:
+            shutil.rmtree(version_path, ignore_errors=True)
+
+            if isinstance(e, CalledProcessError):
+                if e.output:
+                    output = e.output.decode('utf-8')
+                    info(re.sub(r'(https?://)[^/]+:[^/]+@', r'\1<xxx>:<xxx>@', output))
+
+                error(f'! Failed to install using Python {python_version}.'
+                      ' If this app requires a different Python version, please specify it using --python option.')
+
+                # Remember the failure so cron does not rebuild the same version over and over
+                failed_builds = self.settings().get('failed_builds', {})
+                failed_builds[version] = {'python_version': python_version, 'failed_at': round(time())}
+                self.settings(failed_builds=failed_builds)
+
+            raise
+
+        # Save exact dependencies so the version can be re-installed without resolving dependencies
+        try:
+            if locked:
+                if lock_file != saved_lock_file:
+                    saved_lock_file.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(lock_file, saved_lock_file)
 
             else:
-                script_symlink.symlink_to(script_path)
-                info('+ ' + str(script_symlink.name))
+                installed = None if report_file.exists() else installer.list_installed(version_path)
+                if installed and layer:
+                    installed = layer.own_pins(version_path, layer_path, installed)
 
-        for script in sorted(old_scripts):
-            script_symlink = self.paths.symlink_root / script
-            if script_symlink.exists():
-                script_symlink.unlink()
-                info('- Removed {}'.format(script_symlink.name))
+                write_lockfile(saved_lock_file, self.name, version, python_version, report_file=report_file,
+                               installed=installed)
 
-        if not printed_updating and sys.stdout.isatty() and current_scripts and 'update' not in sys.argv:
-            info('Scripts are in {}: {}'.format(self.paths.symlink_root, ', '.join(sorted(current_scripts))))
+        except Exception as e:
+            debug('Could not save lock file: %s', e)
 
-        # Remove pyc for non-root installs for all versions, not just current.
-        if os.getuid():
-            try:
-                run(f'find {self.path} -name *.pyc | xargs rm', executable='/bin/bash', stderr=STDOUT, shell=True)
-            except Exception as e:
-                debug('Could not remove *.pyc files: %s', e)
+        finally:
+            if report_file.exists():
+                report_file.unlink()
+
+        try:
+            shutil.rmtree(version_path / 'share' / 'python-wheels', ignore_errors=True)
+            installer.remove_tool(version_path, 'pip')
+
+        except Exception as e:
+            debug('Could not remove unnecessary packages/files: %s', e)
+
+        # Share identical files with other apps / versions
+        try:
+            dedupe([version_path], self.paths.store_root)
+            collect_garbage(self.paths.store_root)
+
+        except Exception as e:
+            debug('Could not dedupe files: %s', e)
+
+        failed_builds = self.settings().get('failed_builds', {})
+        if failed_builds.pop(version, None):
+            self.settings(build_seconds=round(time() - start_time), failed_builds=failed_builds)
+        else:
+            self.settings(build_seconds=round(time() - start_time))
+
+    def bundle(self, version, bundle_file):
+        """
+        Create a bundle of the installed version that can be installed on other hosts by extracting it instead of
+        building it again
+
+        :param str version: Installed version of the app
+        :param Path bundle_file: Bundle file to create
+        :return: Metadata of the bundle
+        """
+        version_path = self.path / version
+        if not version_path.exists():
+            raise exceptions.InvalidAction(f'{self.name} {version} is not installed')
+
+        if list(version_path.glob(f'lib/python*/site-packages/{BASE_PTH_FILE}')):
+            raise exceptions.InvalidAction(f'{self.name} {version} uses the shared base layer, so it can not be '
+                                           'bundled. Please re-install it with --no-base first.')
+
+        lock_file = self.lock_file(version)
+
+        return create_bundle(version_path, bundle_file, {
+            'app': self.name,
+            'version': version,
+            'app_spec': self.settings().get('app_spec', self.name),
+            'python_version': self.settings().get('python_version', PYTHON_VERSION),
+            'lock_file': lock_file.read_text() if lock_file.exists() else None,
+        })
+
+    def unbundle(self, bundle_file):
+        """
+        Install the version of the app from the bundle without making it the current version
+
+        :param Path bundle_file: Bundle created by :meth:`bundle`
+        """
+        bundle = read_bundle_info(bundle_file)
+        version_path = self.path / bundle['version']
+
+        python_path = shutil.which('python' + bundle['python_version'])
+        if not python_path:
+            raise exceptions.MissingError(f'python{bundle["python_version"]} does not exist. '
+                                          'Please install it first, or ensure its path is in PATH.')
+
+        info(f'Installing {self.name} to {version_path} from {bundle_file}')
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        extract_bundle(bundle_file, version_path, python_path)
+
+        if bundle.get('lock_file'):
+            lock_file = self.lock_file(bundle['version'])
+            lock_file.parent.mkdir(parents=True, exist_ok=True)
+            lock_file.write_text(bundle['lock_file'])
+
+        try:
+            dedupe([version_path], self.paths.store_root)
+            collect_garbage(self.paths.store_root)
+
+        except Exception as e:
+            debug('Could not dedupe files: %s', e)
+
+    def failed_build(self, version, python_version):
+        """
+        Check if the version failed to install using the Python version recently
+
+        :param str version: Version of the app
+        :param str python_version: Python version of the install
+        :return: Time when it failed, or None if it did not fail within :attr:`FAILED_BUILD_RETRY_SECONDS`
+        """
+        failed_build = self.settings().get('failed_builds', {}).get(version)
+
+        if (failed_build and failed_build['python_version'] == python_version
+                and time() - failed_build['failed_at'] < self.FAILED_BUILD_RETRY_SECONDS):
+            return datetime.fromtimestamp(failed_build['failed_at'])
+
+    def lock_file(self, version):
+        """ Path to the lock file with exact dependencies of the given version """
+        return self.path / '.lockfiles' / f'{version}.txt'
+
+    def stage(self, version, python_version=None):
+        """
+        Build the version ahead of time so it can be activated later
+
+        :param str version: Version of the app to stage
+        :param str python_version: Python version to run app. Defaults to the one used by current version.
+        :return: True if the version is staged, otherwise False if it is already the current version
+        """
+        if version == self.current_version:
+            return False
+
+        if not (self.path / version).exists():
+            with low_priority():
+                self.build(version, python_version or self.settings().get('python_version') or PYTHON_VERSION,
+                           action='Staging')
+
+        self.settings(staged_version=version)
 
         return True
 
+    @property
+    def staged_version(self):
+        """ Version that was built ahead of time and is waiting to be activated """
+        version = self.settings().get('staged_version')
+        if version and version != self.current_version and (self.path / version).exists():
+            return version
+
+    @property
+    def can_activate_staged(self):
+        """ True if the staged version can be activated now per the activation window of the app """
+        window = self.settings().get('activate_window')
+        return not window or window != 'manual' and in_time_window(window)
+
+    def activate(self, version):
+        """
+        Switch the current version to the given installed version and update script symlinks
+
+        :param str version: Installed version to switch to
+        """
+        self._set_current(self.path / version)
+        self._link_scripts()
+
+        if self.settings().get('staged_version'):
+            self.settings(staged_version=None)
+
+    def rollback(self, version=None):
+        """
+        Switch the current version to a previously installed version without reinstalling
+
+        :param str version: Version to switch to. Defaults to the version before the current one.
+        """
+        versions = self.versions
+        current_version = self.current_version
+
+        if not version:
+            older_versions = versions[:versions.index(current_version)] if current_version in versions else []
+            if not older_versions:
+                raise exceptions.InvalidAction(f'No older version of {self.name} is installed to rollback to. '
+                                               f'Installed versions: {", ".join(versions)}')
+            version = older_versions[-1]
+
+        elif version not in versions:
+            raise exceptions.InvalidAction(f'{self.name} {version} is not installed. '
+                                           f'Installed versions: {", ".join(versions)}')
+
+        if version == current_version:
+            info(f'{self.name} {version} is already the current version')
+            return
+
+        info(f'Rolled back {self.name} from {current_version} to {version}')
+        self.activate(version)
+
+        if self.settings().get('update'):
+            self.settings(app_spec=f'{self.name}=={version}')
+            info(f'Auto-update is paused as {self.name} is now pinned to {version}. '
+                 f'To resume, re-run install for {self.name} with --update option.')
+
+    def prune(self):
+        """ Remove installed versions beyond the number of versions to keep """
+        keep_versions = max(self.settings().get('keep_versions') or self.DEFAULT_KEEP_VERSIONS, 1)
+        important_versions = {self.current_version, self.staged_version}
+        other_versions = [v for v in self.versions if v not in important_versions]
+        old_versions = other_versions[:max(len(other_versions) - keep_versions + 1, 0)]
+
+        for version in old_versions:
+            debug('Removing %s %s', self.name, version)
+            trash(self.path / version, self.paths.trash_root)
+
+        return old_versions
+
+    def _set_current(self, version_path):
+        """ Atomically point the current symlink to the given version path """
+        if self.current_path and self.current_path.resolve() == version_path:
+            return
+
+        atomic_symlink = self.path / f'atomic_symlink_for_{self.name}'
+        if atomic_symlink.is_symlink():  # Left over from a crashed install
+            atomic_symlink.unlink()
+        atomic_symlink.symlink_to(version_path)
+        atomic_symlink.replace(self._current_symlink)
+
+    def _link_scripts(self):
+        """
+        Update script symlinks to point to the current version, and remove symlinks of scripts that no longer exist
+        or were left over from crashed installs.
+
+        :return: True if any script symlink was changed
+        """
+        self.settings(scripts=sorted(self.scripts()))
+
+        launcher = self.settings().get('launcher', 'symlink')
+        try:
+            if launcher == 'symlink':
+                shutil.rmtree(self.current_path / SHIMS_DIR, ignore_errors=True)
+            else:
+                write_shims(self.current_path.resolve(), self.entry_points(),
+                            isolated=launcher == 'isolated-shim')
+
+        except Exception as e:
+            debug('Could not write launcher shims, so linking to scripts instead: %s', e)
+            shutil.rmtree(self.current_path / SHIMS_DIR, ignore_errors=True)
+
+        printed_updating = False
+
+        with self.paths.global_lock():
+            changes = _plan_links(self.paths, priority_app=self)
+            apply_links(self.paths.symlink_root, changes)
+
+        for change in changes:
+            if not printed_updating:
+                info('Updating script symlinks in {}'.format(self.paths.symlink_root))
+                printed_updating = True
+
+            if change.action == 'create':
+                info('+ ' + change.name)
+            elif change.action == 'update':
+                info('* {} (updated)'.format(change.name))
+            elif change.action == 'remove':
+                info('- Removed {}'.format(change.name))
+            else:
+                info('! {} ({})'.format(change.name, change.reason))
+
+        return printed_updating
+
     def settings(self, **new_settings):
         """ Get or set settings """
         current_settings = {}
 
         if self.path.exists():
             settings_file = self.path / 'settings.json'
-            if settings_file.exists():
-                try:
-                    current_settings.update(json.load(settings_file.open()))
-                except Exception as e:
-                    debug('Could not load app settings: %s', e)
 
             if new_settings:
-                current_settings.update(new_settings)
-                with settings_file.open('w') as fh:
-                    json.dump(current_settings, fh)
+                with self.paths.global_lock():
+                    current_settings.update(self._load_settings(settings_file))
+                    current_settings.update(new_settings)
+
+                    # Write to a temp file and then rename so readers never see a partially written file
+                    tmp_settings_file = settings_file.with_name(f'.settings.json.{os.getpid()}')
+                    with tmp_settings_file.open('w') as fh:
+                        json.dump(current_settings, fh)
+                    tmp_settings_file.replace(settings_file)
+
+            else:
+                current_settings.update(self._load_settings(settings_file))
 
         return current_settings
 
+    @staticmethod
+    def _load_settings(settings_file):
+        """ Load settings from the given file """
+        if settings_file.exists():
+            try:
+                return json.load(settings_file.open())
+            except Exception as e:
+                debug('Could not load app settings: %s', e)
+
+        return {}
+
+    def info(self):
+        """ Dict of info about the current version, such as its version and scripts, without running subprocesses """
+        settings = self.settings()
+        version_path = self.current_path.resolve()
+
+        return {
+            'name': self.name,
+            'version': version_path.name,
+            'path': str(version_path),
+            'python_version': settings.get('python_version'),
+            'update': settings.get('update'),
+            'adaptive_update': bool(settings.get('adaptive_update')),
+            'launcher': settings.get('launcher', 'symlink'),
+            'scripts': sorted(self.current_scripts(settings)),
+            'last_update': datetime.fromtimestamp(version_path.stat().st_mtime).isoformat(),
+            'size': _disk_usage(version_path),
+        }
+
+    def current_scripts(self, settings=None):
+        """
+        Set of scripts for the current version as saved during install, which avoids inspecting the app in a
+        subprocess. Apps installed by older autopip versions are inspected instead.
+
+        :param dict settings: Settings of the app if already loaded
+        """
+        scripts = (settings or self.settings()).get('scripts')
+        return set(scripts) if scripts is not None else self.scripts()
+
     def scripts(self, path=None):
         """ Set of scripts for the given app path (defaults to current). """
         dist = self._pkg_info(path=path)
         return dist and set(dist['scripts']) or set()
 
+    def entry_points(self, path=None):
+        """ Dict of script name to its console_scripts entry point for the given app path (defaults to current). """
+        dist = self._pkg_info(path=path)
+        return dist and dist.get('entry_points') or {}
+
+    def script_path(self, script, settings=None):
+        """
+        Path that the symlink of the script should point to: its launcher shim if the app uses shims and the script
+        has one, otherwise the script in the virtual environment.
+
+        :param str script: Name of the script
+        :param dict settings: Settings of the app if already loaded
+        """
+        settings = self.settings() if settings is None else settings
+
+        if settings.get('launcher', 'symlink') != 'symlink':
+            shim = self.current_path / SHIMS_DIR / script
+            if shim.exists():
+                return shim
+
+        return self.current_path / 'bin' / script
+
     def group_specs(self, path=None, name_only=False):
         """ List of app specs from this app's "autopip" entry points for the given app path (defaults to current)"""
         app_specs = []
@@ -677,10 +1956,8 @@ class App:
         inspect_py = Path(__file__).parent / 'inspect_app.py'
 
         try:
-            info = run(f"""set -e
-                source {path / 'bin/activate'}
-                python {inspect_py} {self.name}
-                """, executable='/bin/bash', stderr=STDOUT, shell=True)
+            info = run([str(path / 'bin' / 'python'), str(inspect_py), self.name], stderr=STDOUT,
+                       env=child_env(path))
             return json.loads(info)
 
         except Exception as e:
@@ -696,7 +1973,94 @@ class App:
                     and str(script_symlink.resolve()).startswith(str(self.path))):
                 script_symlink.unlink()
 
-        shutil.rmtree(self.path)
+        trash(self.path, self.paths.trash_root)
+
+
+def _installed_apps(paths):
+    """ Iterator for apps installed in the install root of the given :cls:`AppsPath` """
+    for app_path in sorted(paths.install_root.iterdir()):
+        if app_path in {paths.symlink_root, paths.log_root}:
+            continue
+
+        app = App(app_path.name, paths)
+
+        if app.is_installed:
+            yield app
+
+
+def _plan_links(paths, priority_app=None):
+    """
+    Plan changes to make script symlinks match the scripts of all installed apps using a single scan of the symlink
+    root. Scripts provided by more than one app keep pointing to their current app, unless it is the priority app.
+
+    :param AppsPath paths: Paths of the apps
+    :param App priority_app: App that was just installed, which owns all of its scripts
+    :return: List of :cls:`LinkChange`
+    """
+    entries = scan_links(paths.symlink_root)
+    targets = defaultdict(list)
+
+    for app in _installed_apps(paths):
+        if priority_app and app.name == priority_app.name:
+            continue
+
+        settings = {}
+        try:
+            settings = app.settings()
+            scripts = app.current_scripts(settings)
+            if 'scripts' not in settings:  # Save so next scan does not need to inspect the app again
+                app.settings(scripts=sorted(scripts))
+
+        except Exception as e:
+            debug('Could not get scripts of %s, so keeping its symlinks as is: %s', app.name, e)
+            app_prefix = str(app.path) + os.sep
+            scripts = {n for n, target in entries.items() if target and target.startswith(app_prefix)}
+
+        for script in scripts:
+            targets[script].append(str(app.script_path(script, settings)))
+
+    desired = {script: entries[script] if entries.get(script) in script_targets else script_targets[0]
+               for script, script_targets in targets.items()}
+
+    priority_scripts = set()
+    if priority_app:
+        settings = priority_app.settings()
+        priority_scripts = priority_app.current_scripts(settings)
+        desired.update({script: str(priority_app.script_path(script, settings)) for script in priority_scripts})
+
+    managed_roots = [paths.SYSTEM_INSTALL_ROOT, paths.LOCAL_INSTALL_ROOT, paths.USER_INSTALL_ROOT]
+    # Only autopip takes over its own scripts that are not managed, such as when it was installed by pip before
+    takeover = set(priority_scripts) if priority_app and priority_app.name == 'autopip' else set()
+
+    return plan_links(entries, desired, paths.install_root, managed_roots=managed_roots, takeover=takeover)
+
+
+def _disk_usage(path):
+    """ Disk usage in bytes of all files in the given path """
+    usage = 0
+
+    for entry in os.scandir(path):
+        stat = entry.stat(follow_symlinks=False)
+        usage += stat.st_blocks * 512
+
+        if entry.is_dir(follow_symlinks=False):
+            usage += _disk_usage(entry.path)
+
+    return usage
+
+
+def _print_table(rows):
+    """ Print rows of values as a table with aligned columns """
+    column_lens = defaultdict(int)
+
+    # Figure out max length of each column
+    for row in rows:
+        for i, value in enumerate(row):
+            column_lens[i] = len(value) if len(value) > column_lens[i] else column_lens[i]
+
+    table_style = '  '.join('{{:{}}}'.format(lens) if lens else '{}' for lens in column_lens.values())
+    for row in rows:
+        info(table_style.format(*row))
 
 
 class AppsPath:
@@ -792,6 +2156,30 @@ class AppsPath:
         self.symlink_root.mkdir(parents=True, exist_ok=True)
         self.log_root.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def lock_root(self):
+        """ Root of lock files used to coordinate concurrent autopip processes """
+        return self.install_root / '.locks'
+
+    def global_lock(self):
+        """ Short lock for changes shared by all apps, such as crontab and settings """
+        return file_lock(self.lock_root / 'global')
+
+    @property
+    def store_root(self):
+        """ Root of the content store for files shared across app versions """
+        return self.install_root / '.store'
+
+    @property
+    def state_root(self):
+        """ Root of state files that are shared across runs, such as the circuit breaker state of the index """
+        return self.install_root / '.state'
+
+    @property
+    def trash_root(self):
+        """ Root of directories to remove in the background, which is on the same filesystem as the apps """
+        return self.install_root / TRASH_DIR
+
     def covers(self, path):
         """ True if the given path belongs to autopip """
         path = path.resolve() if isinstance(path, PurePath) else path
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+from logging import info, debug
+import os
+import pstats
+import tracemalloc
+
+from autopip.utils import format_spawn_summary, spawn_summary
+
+#: Env var to turn on profiling, such as for commands run from cron
+PROFILE_ENV_VAR = 'AUTOPIP_PROFILE'
+
+#: Number of hotspots to show in the summary
+PROFILE_TOP = 15
+
+#: Number of profiles to keep in the profiles dir. Older ones are removed.
+PROFILE_KEEP = 20
+
+
+def profile_enabled(flag=False):
+    """ True if profiling is turned on by the given flag or :data:`PROFILE_ENV_VAR` env var """
+    return bool(flag) or os.environ.get(PROFILE_ENV_VAR, '').lower() not in ('', '0', 'false', 'no')
+
+
+@contextmanager
+def profile(profiles_root, command, top=PROFILE_TOP):
+    """
+    Record CPU profile and peak memory of the code run in the context. On exit, the profile is saved to a .prof file
+    (for pstats, snakeviz, etc) and a summary of the top hotspots is saved to a .txt file next to it and logged.
+    Only the main thread is profiled.
+
+    :param Path profiles_root: Dir to save profiles in
+    :param str command: Name of the command being profiled, used in the file names
+    :param int top: Number of hotspots to show
+    """
+    profiler = cProfile.Profile()
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    start_time = datetime.now()
+
+    profiler.enable()
+    try:
+        yield profiler
+
+    finally:
+        profiler.disable()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+        try:
+            profiles_root.mkdir(parents=True, exist_ok=True)
+            profile_file = profiles_root / f'{command}-{start_time:%Y%m%d-%H%M%S}-{os.getpid()}.prof'
+            profiler.dump_stats(str(profile_file))
+
+            summary = profile_summary(profiler, snapshot, peak_memory, top=top)
+            if spawn_summary():
+                summary += '\n\nProcesses started:\n' + format_spawn_summary()
+            profile_file.with_suffix('.txt').write_text(summary + '\n')
+
+            info('Profile of %s command:\n%s', command, summary)
+            info('Saved profile to %s', profile_file)
+
+            for old_file in sorted(profiles_root.glob('*.prof'), key=lambda p: p.stat().st_mtime)[:-PROFILE_KEEP]:
+                old_file.unlink()
+                if old_file.with_suffix('.txt').exists():
+                    old_file.with_suffix('.txt').unlink()
+
+        except Exception as e:
+            debug('Could not save profile: %s', e)
+
+
+def profile_summary(profiler, snapshot, peak_memory, top=PROFILE_TOP):
+    """
+    Summarize hotspots of the profile
+
+    :param cProfile.Profile profiler: Profiler that was run
+    :param tracemalloc.Snapshot snapshot: Memory snapshot taken at the end
+    :param int peak_memory: Peak memory traced in bytes
+    :param int top: Number of hotspots to show
+    :return: Text with top functions by cumulative time, and top lines by memory allocated
+    """
+    stats = pstats.Stats(profiler).stats
+    total_seconds = max((ct for _, _, _, ct, _ in stats.values()), default=0)
+    lines = [f'Total time: {total_seconds:.3f}s  Peak memory: {peak_memory / 1024 / 1024:.1f} MB',
+             '',
+             '  cumtime  tottime    calls  function']
+
+    by_cumtime = sorted(stats.items(), key=lambda s: s[1][3], reverse=True)
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in by_cumtime[:top]:
+        location = f'{filename}:{line}({name})' if line else name
+        lines.append(f'{cumtime:8.3f}s {tottime:7.3f}s {calls:8}  {location}')
+
+    lines.extend(['', '   memory  allocated at'])
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        lines.append(f'{stat.size / 1024:7.0f}KB  {frame.filename}:{frame.lineno}')
+
+    return '\n'.join(lines)
@@ -0,0 +1,59 @@
+class ActionResult:
+    """ Result of an action on an app, such as install or uninstall """
+
+    #: Actions that can be recorded
+    ACTIONS = ('install', 'upgrade', 'stage', 'rollback', 'uninstall', 'defer', 'none', 'error')
+
+    def __init__(self, app, action='none', old_version=None, new_version=None, scripts_added=None,
+                 scripts_removed=None, seconds=0, error=None):
+        """
+        :param str app: Name of the app
+        :param str action: One of :attr:`ACTIONS`. "none" means the app was already up-to-date or not updated yet.
+                           "defer" means the app was not checked as the update budget was used up.
+        :param str old_version: Version before the action
+        :param str new_version: Version after the action
+        :param list[str] scripts_added: Scripts that were added
+        :param list[str] scripts_removed: Scripts that were removed
+        :param float seconds: Number of seconds the action took
+        :param str error: Error message if the action failed
+        """
+        self.app = app
+        self.action = action
+        self.old_version = old_version
+        self.new_version = new_version
+        self.scripts_added = scripts_added or []
+        self.scripts_removed = scripts_removed or []
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self):
+        """ True if the action did not fail """
+        return self.error is None
+
+    @property
+    def changed(self):
+        """ True if the action changed the app """
+        return self.action not in ('defer', 'none', 'error')
+
+    def set_scripts(self, old_scripts, new_scripts):
+        """ Record the scripts that changed between the given sets of scripts """
+        self.scripts_added = sorted(set(new_scripts) - set(old_scripts))
+        self.scripts_removed = sorted(set(old_scripts) - set(new_scripts))
+
+    def fail(self, e):
+        """ Record the given exception as the error of the action """
+        self.action = 'error'
+        self.error = str(e) or e.__class__.__name__
+
+    def to_dict(self):
+        """ Result as a dict that can be serialized as JSON """
+        return {'app': self.app, 'action': self.action, 'old_version': self.old_version,
+                'new_version': self.new_version, 'scripts_added': self.scripts_added,
+                'scripts_removed': self.scripts_removed, 'seconds': self.seconds, 'error': self.error}
+
+    def __eq__(self, other):
+        return isinstance(other, ActionResult) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'ActionResult({", ".join(f"{k}={v!r}" for k, v in self.to_dict().items())})'
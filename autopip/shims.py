@@ -0,0 +1,77 @@
+import os
+import re
+
+#: Directory in app versions with the launcher shims
+SHIMS_DIR = '.shims'
+
+#: Marker in launcher shims to identify them as generated by autopip
+SHIM_MARKER = '# Launcher generated by autopip'
+
+#: Launchers for scripts of apps:
+#: - symlink: Symlink to the script in the virtual environment created by the installer
+#: - shim: Minimal launcher that imports the entry point directly with the Python interpreter of the app
+#: - isolated-shim: Same as shim, but runs Python in isolated mode (-I) to ignore PYTHON* env vars and user site
+LAUNCHERS = ('symlink', 'shim', 'isolated-shim')
+
+_ENTRY_POINT_RE = re.compile(r'^(?P<module>[\w.]+)\s*(:\s*(?P<attrs>[\w.]+))?\s*(\[.*\])?$')
+
+
+def shim_source(python_path, entry_point, isolated=False):
+    """
+    Source of a launcher that calls the entry point without the startup cost of the installer generated script
+
+    :param Path python_path: Python interpreter of the app
+    :param str entry_point: Entry point value, such as "package.module:main"
+    :param bool isolated: Run Python in isolated mode
+    :return: Source of the launcher, or None if the entry point can not be parsed or has no function to call, such as
+             a module only entry point, so the script from the installer should be used instead.
+    """
+    match = _ENTRY_POINT_RE.match(entry_point.strip())
+    if not match or not match.group('attrs'):
+        return
+
+    module, attrs = match.group('module'), match.group('attrs')
+
+    return (f'#!{python_path}{" -I" if isolated else ""}\n'
+            f'{SHIM_MARKER} for {entry_point}\n'
+            'import sys\n'
+            f'from {module} import {attrs.split(".")[0]}\n'
+            '\n'
+            "if __name__ == '__main__':\n"
+            f'    sys.exit({attrs}())\n')
+
+
+def write_shims(version_path, entry_points, isolated=False):
+    """
+    Write launcher shims for the entry points of the app version, and remove shims of entry points that no longer
+    exist. Scripts without an entry point, such as scripts from setup.py, do not get a shim.
+
+    :param Path version_path: Path of the app version
+    :param dict entry_points: Dict of script name to entry point value
+    :param bool isolated: Run Python in isolated mode
+    :return: Set of script names with a shim
+    """
+    shims_path = version_path / SHIMS_DIR
+    shims_path.mkdir(exist_ok=True)
+    python_path = version_path / 'bin' / 'python'
+    shims = set()
+
+    for script, entry_point in entry_points.items():
+        source = shim_source(python_path, entry_point, isolated=isolated)
+        if not source:
+            continue
+
+        shim = shims_path / script
+        if not shim.exists() or shim.read_text() != source:
+            tmp_shim = shims_path / f'.{script}.{os.getpid()}'
+            tmp_shim.write_text(source)
+            tmp_shim.chmod(0o755)
+            tmp_shim.replace(shim)
+
+        shims.add(script)
+
+    for shim in shims_path.iterdir():
+        if shim.name not in shims:
+            shim.unlink()
+
+    return shims
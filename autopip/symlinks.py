@@ -0,0 +1,103 @@
+from collections import namedtuple
+import os
+
+#: Prefix of temporary symlinks used to atomically replace script symlinks
+ATOMIC_SYMLINK_PREFIX = 'atomic_symlink_for_'
+
+#: A change to a script symlink: action is create, update, remove or conflict (can not be changed)
+LinkChange = namedtuple('LinkChange', 'action name target reason')
+
+
+def scan_links(symlink_root):
+    """
+    Scan the symlink root once without resolving any symlinks
+
+    :param Path symlink_root: Directory with script symlinks
+    :return: Dict of entry name to the absolute path its symlink points to, or None if it is not a symlink
+    """
+    entries = {}
+
+    try:
+        with os.scandir(symlink_root) as it:
+            for entry in it:
+                if entry.is_symlink():
+                    entries[entry.name] = os.path.normpath(os.path.join(symlink_root, os.readlink(entry.path)))
+                else:
+                    entries[entry.name] = None
+
+    except FileNotFoundError:
+        pass
+
+    return entries
+
+
+def plan_links(entries, desired, owned_root, managed_roots=(), takeover=()):
+    """
+    Compute the minimal set of changes to make the symlink root match the desired symlinks
+
+    :param dict entries: Current entries from :func:`scan_links`
+    :param dict desired: Dict of script name to the path its symlink should point to
+    :param Path owned_root: Install root of the apps. Symlinks pointing into it that are not desired are removed.
+    :param list[Path] managed_roots: Other install roots of autopip. Symlinks pointing into them can be updated.
+    :param set takeover: Script names that can be updated even if not managed by autopip
+    :return: List of :cls:`LinkChange` sorted by script name
+    """
+    owned_prefix = str(owned_root) + os.sep
+    managed_prefixes = tuple(str(r) + os.sep for r in managed_roots) + (owned_prefix,)
+    changes = []
+
+    for name, target in sorted(desired.items()):
+        target = str(target)
+
+        if name not in entries:
+            changes.append(LinkChange('create', name, target, 'missing'))
+
+        elif entries[name] == target:
+            continue
+
+        elif name in takeover or entries[name] and (entries[name].startswith(managed_prefixes)
+                                                    or not os.path.exists(entries[name])):
+            changes.append(LinkChange('update', name, target, f'points to {entries[name] or "a file"}'))
+
+        else:
+            changes.append(LinkChange('conflict', name, target, 'can not change / not managed by autopip'))
+
+    for name, current_target in sorted(entries.items()):
+        if name in desired or not current_target:
+            continue
+
+        if name.startswith(ATOMIC_SYMLINK_PREFIX):
+            changes.append(LinkChange('remove', name, current_target, 'left over from a crashed install'))
+
+        elif current_target.startswith(owned_prefix):
+            reason = 'not provided by any app' if os.path.exists(current_target) else 'dangling'
+            changes.append(LinkChange('remove', name, current_target, reason))
+
+    return sorted(changes, key=lambda c: c.name)
+
+
+def apply_links(symlink_root, changes):
+    """
+    Apply the changes from :func:`plan_links`. Conflicts are skipped.
+
+    :param Path symlink_root: Directory with script symlinks
+    :param list[LinkChange] changes: Changes to apply
+    """
+    for change in changes:
+        script_symlink = symlink_root / change.name
+
+        if change.action == 'create':
+            script_symlink.symlink_to(change.target)
+
+        elif change.action == 'update':
+            atomic_symlink = symlink_root / f'{ATOMIC_SYMLINK_PREFIX}{change.name}'
+            if atomic_symlink.is_symlink():  # Left over from a crashed install
+                atomic_symlink.unlink()
+            atomic_symlink.symlink_to(change.target)
+            atomic_symlink.replace(script_symlink)
+
+        elif change.action == 'remove':
+            try:
+                script_symlink.unlink()
+            except FileNotFoundError:
+                pass
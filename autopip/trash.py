@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+import argparse
+import fcntl
+from logging import debug
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+from time import time
+
+from autopip.dedupe import collect_garbage
+from autopip.utils import low_priority_cmd, record_spawn
+
+#: Directory in the install root with directories that are waiting to be removed
+TRASH_DIR = '.trash'
+
+# Lock file in the trash that is held by the process reaping it
+_REAP_LOCK = '.reap.lock'
+
+
+def trash(path, trash_root):
+    """
+    Move the directory to the trash to remove it later by :func:`reap`, which is instant as it is only a rename. It is
+    removed right away if it can not be moved, such as when the trash is on another filesystem.
+
+    :param Path path: Directory to remove
+    :param Path trash_root: Trash to move it to. It should be on the same filesystem as the path.
+    :return: Path in the trash, or None if it was removed right away
+    """
+    trash_root.mkdir(parents=True, exist_ok=True)
+    trash_path = trash_root / f'{path.name}.{time():.6f}.{os.getpid()}'
+
+    try:
+        path.rename(trash_path)
+        return trash_path
+
+    except OSError as e:
+        debug('Could not move %s to trash, so removing it now: %s', path, e)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def has_trash(trash_root):
+    """ True if there are directories in the trash to reap """
+    return trash_root.exists() and any(not p.name.startswith('.') for p in trash_root.iterdir())
+
+
+def reap(trash_root):
+    """
+    Remove everything in the trash. Only one process reaps at a time, and others return right away. Directories left
+    by a reap that crashed or was killed are removed by the next one.
+
+    :param Path trash_root: Trash to reap
+    :return: Number of directories removed, or None if another process is reaping
+    """
+    if not trash_root.exists():
+        return 0
+
+    with open(trash_root / _REAP_LOCK, 'a') as fp:
+        try:
+            fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            debug('Another process is reaping %s', trash_root)
+            return
+
+        removed = 0
+        for path in sorted(trash_root.iterdir()):
+            if path.name.startswith('.'):
+                continue
+
+            debug('Removing %s', path)
+            shutil.rmtree(path, ignore_errors=True)
+            removed += not path.exists()
+
+        return removed
+
+
+def reap_in_background(trash_root, store_root=None):
+    """
+    Start a detached process with low CPU and I/O priority to reap the trash, so the caller does not wait for it
+
+    :param Path trash_root: Trash to reap
+    :param Path store_root: Content store to remove unused files from after reaping, as trashed app versions may
+                            have been the last ones to use them
+    :return: Started process, or None if autopip itself was trashed, so the trash was reaped in this process
+    """
+    package_root = Path(__file__).parent.parent
+    if not (Path(sys.executable).exists() and package_root.exists()):
+        reap(trash_root)
+        return
+
+    cmd = [sys.executable, '-m', 'autopip.trash', str(trash_root)] + ([str(store_root)] if store_root else [])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(package_root), os.environ.get('PYTHONPATH')])))
+    debug('Running in background: %s', cmd)
+
+    try:
+        process = subprocess.Popen(low_priority_cmd(cmd), env=env, cwd='/', stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    except Exception:
+        record_spawn(cmd, 0, exit_status=None)
+        raise
+
+    record_spawn(cmd, 0)
+
+    return process
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=reap.__doc__)
+    parser.add_argument('trash_root', help='Trash to reap')
+    parser.add_argument('store_root', nargs='?', help='Content store to remove unused files from after reaping')
+    args = parser.parse_args()
+
+    # Store files may still be unused if a previous reap was killed after removing the trash
+    if reap(Path(args.trash_root)) is not None and args.store_root:
+        collect_garbage(Path(args.store_root))
@@ -1,13 +1,288 @@
+from contextlib import contextmanager
+from datetime import datetime
 from logging import debug
+import os
+import pkg_resources
 import re
+import shlex
+import shutil
 from subprocess import check_output
+import threading
+from time import time
+
+# Indicates if processes started by :func:`run` in the current thread should have low priority. See :func:`low_priority`
+_priority = threading.local()
+
+# Stats of processes started by :func:`run` by command class. See :func:`spawn_summary`
+_spawns = {}
+_spawns_lock = threading.Lock()
+
+# Shell builtins that are skipped when finding the command class of a shell script
+_SHELL_BUILTINS = {'set', 'source', '.', 'cd', 'export', 'exec'}
 
 
 def run(*args, **kwargs):
-    debug('Running: %s', args[0])
-    return check_output(*args, **kwargs).decode('utf-8')
+    cmd = args[0]
+    debug('Running: %s', cmd)
+    start_time = time()
+    exit_status = 0
+    output = b''
+
+    try:
+        if getattr(_priority, 'low', False):
+            args = (low_priority_cmd(cmd, shell=kwargs.get('shell')),) + args[1:]
+        output = check_output(*args, **kwargs)
+        return output.decode('utf-8')
+
+    except Exception as e:
+        exit_status = getattr(e, 'returncode', None)
+        output = getattr(e, 'output', None) or b''
+        raise
+
+    finally:
+        record_spawn(cmd, time() - start_time, exit_status, len(output))
+
+
+def child_env(venv_path=None):
+    """
+    Env vars for a child process that are not affected by the Python environment autopip runs in, such as an activated
+    virtual environment, without changing env vars of the current process.
+
+    :param Path venv_path: Virtual environment to activate for the child process like its activate script does
+    :return: Dict of env vars
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONPATH', None)
+    env.pop('PYTHONHOME', None)
+
+    paths = env.get('PATH', '').split(os.pathsep)
+    old_venv_dir = env.pop('VIRTUAL_ENV', None)
+    if old_venv_dir:
+        paths = [p for p in paths if os.path.exists(p) and not p.startswith(old_venv_dir)]
+
+    if venv_path:
+        env['VIRTUAL_ENV'] = str(venv_path)
+        paths.insert(0, str(venv_path / 'bin'))
+
+    env['PATH'] = os.pathsep.join(paths)
+
+    return env
+
+
+def command_class(cmd):
+    """
+    Class of the command to group its stats by, such as "pip install" or "python -m venv", as commands differ by args
+
+    :param str|list cmd: Command as passed to :func:`run`. For shell scripts, the first command that is not a builtin
+                         is used.
+    """
+    if isinstance(cmd, str):
+        for line in re.split(r'[\n;|&]+', cmd):
+            words = line.strip(' ()').split()
+            if words and words[0] not in _SHELL_BUILTINS:
+                try:
+                    cmd = shlex.split(line.strip(' ()'))
+                except ValueError:
+                    cmd = words
+                break
+        else:
+            return 'shell'
+
+    words = [str(w) for w in cmd]
+    program = os.path.basename(words[0])
+    arg = words[1] if len(words) > 1 else ''
+
+    if re.match(r'python[\d.]*$', program):
+        if arg == '-m' and len(words) > 3 and words[2] == 'pip':
+            return f'pip {words[3]}'
+        if arg in ('-m', '-c'):
+            return f'python {arg} {words[2]}' if arg == '-m' and len(words) > 2 else f'python {arg}'
+        return f'python {os.path.basename(arg)}' if arg and not arg.startswith('-') else 'python'
+
+    if program in ('pip', 'uv') and arg and not arg.startswith('-'):
+        return f'{program} {arg}'
+
+    return program
+
+
+def record_spawn(cmd, seconds, exit_status=0, output_bytes=0):
+    """
+    Record stats of a process started, which :func:`run` does for every process it starts
+
+    :param str|list cmd: Command of the process
+    :param float seconds: Wall time of the process
+    :param int|None exit_status: Exit status of the process, or None if it could not be started
+    :param int output_bytes: Size of its output
+    """
+    cmd_class = command_class(cmd)
+    debug('Finished %s in %.3fs with exit status %s and %s bytes of output', cmd_class, seconds, exit_status,
+          output_bytes)
+
+    with _spawns_lock:
+        stats = _spawns.setdefault(cmd_class, {'count': 0, 'seconds': 0, 'max_seconds': 0, 'failures': 0,
+                                               'output_bytes': 0})
+        stats['count'] += 1
+        stats['seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['failures'] += exit_status != 0
+        stats['output_bytes'] += output_bytes
+
+
+def spawn_summary():
+    """
+    Stats of processes started by :func:`run` since the start or :func:`reset_spawns`
+
+    :return: Dict of command class to dict with count, seconds (total), max_seconds, failures (non-zero exit status or
+             not started), and output_bytes (total)
+    """
+    with _spawns_lock:
+        return {cmd_class: dict(stats) for cmd_class, stats in sorted(_spawns.items())}
+
+
+def reset_spawns():
+    """ Clear stats of processes started, such as before each command of a long running process """
+    with _spawns_lock:
+        _spawns.clear()
+
+
+def format_spawn_summary(summary=None):
+    """ Text table of :func:`spawn_summary` with the slowest command classes first """
+    summary = spawn_summary() if summary is None else summary
+    lines = ['  count  failures   seconds       max    output  command']
+
+    for cmd_class, stats in sorted(summary.items(), key=lambda s: s[1]['seconds'], reverse=True):
+        lines.append(f"{stats['count']:7} {stats['failures']:9} {stats['seconds']:8.3f}s {stats['max_seconds']:8.3f}s "
+                     f"{stats['output_bytes'] / 1024:7.1f}KB  {cmd_class}")
+
+    return '\n'.join(lines)
+
+
+def assert_spawn_budget(budget, total=None, summary=None):
+    """
+    Assert that processes started are within the budget, such as in tests to catch regressions in number of processes
+
+    :param dict budget: Dict of command class (see :func:`command_class`) to max number of processes. Command classes
+                        not in the budget are not limited unless total is set.
+    :param int total: Max number of processes of all command classes
+    :param dict summary: Result of :func:`spawn_summary`. Defaults to the current one.
+    :raise AssertionError: If any budget is exceeded
+    """
+    summary = spawn_summary() if summary is None else summary
+    over_budget = [f'{cmd_class}: {summary[cmd_class]["count"]} > {max_count}'
+                   for cmd_class, max_count in sorted(budget.items())
+                   if cmd_class in summary and summary[cmd_class]['count'] > max_count]
+
+    spawned = sum(s['count'] for s in summary.values())
+    if total is not None and spawned > total:
+        over_budget.append(f'total: {spawned} > {total}')
+
+    if over_budget:
+        raise AssertionError('Started more processes than budgeted: ' + ', '.join(over_budget) + '\n'
+                             + format_spawn_summary(summary))
 
 
 def sorted_versions(versions):
     version_sep_re = re.compile('[^0-9]+')
     return sorted(versions, key=lambda v: tuple(map(int, version_sep_re.split(v))))
+
+
+def in_time_window(window, now=None):
+    """
+    Check if the time is within the given window
+
+    :param str window: Time window in local time, such as 02:00-04:30. It can span midnight, such as 22:00-02:00.
+    :param datetime now: Time to check. Defaults to now.
+    :return: True if the time is in the window
+    """
+    start, end = [datetime.strptime(t.strip(), '%H:%M').time() for t in window.split('-')]
+    now = (now or datetime.now()).time()
+
+    if start <= end:
+        return start <= now < end
+    else:
+        return now >= start or now < end
+
+
+def low_priority_cmd(cmd, shell=False):
+    """
+    Command that runs the given command with low CPU and I/O priority so it does not disturb others
+
+    :param str|list cmd: Command as passed to :func:`run`
+    :param bool shell: The command is a shell script
+    :return: Command of the same type with nice / ionice prefixed if available
+    """
+    prefix = ['nice', '-n', '10'] if shutil.which('nice') else []
+    if shutil.which('ionice'):
+        prefix += ['ionice', '-c', '3']
+
+    if not prefix:
+        return cmd
+
+    if isinstance(cmd, str):
+        prefix = ' '.join(shlex.quote(w) for w in prefix)
+        return f'{prefix} sh -c {shlex.quote(cmd)}' if shell else f'{prefix} {cmd}'
+
+    return prefix + list(cmd)
+
+
+@contextmanager
+def low_priority():
+    """
+    Start processes with :func:`run` in the current thread with low CPU and I/O priority within the context, such as
+    builds ahead of time. The priority of the current process is not changed.
+    """
+    was_low = getattr(_priority, 'low', False)
+    _priority.low = True
+
+    try:
+        yield
+
+    finally:
+        _priority.low = was_low
+
+
+def find_cycles(graph):
+    """
+    Find cycles in a directed graph
+
+    :param dict graph: Dict of node to list of nodes it points to
+    :return: List of cycles, where each cycle is a list of nodes that starts and ends with the same node
+    """
+    cycles = []
+    visited = set()
+
+    def visit(node, path):
+        if node in path:
+            cycles.append(path[path.index(node):] + [node])
+            return
+
+        if node in visited:
+            return
+        visited.add(node)
+
+        for next_node in graph.get(node, []):
+            visit(next_node, path + [node])
+
+    for node in sorted(graph):
+        visit(node, [])
+
+    return cycles
+
+
+def supports_python(requires_python, python_version):
+    """
+    Check if the Python version meets the Requires-Python specifier of a release
+
+    :param str requires_python: Requires-Python specifier, such as ">=3.7". Invalid specifiers are ignored like pip.
+    :param str python_version: Major and minor Python version, such as "3.11"
+    :return: True if any patch release of the Python version meets the specifier
+    """
+    if not requires_python:
+        return True
+
+    try:
+        requirement = pkg_resources.Requirement.parse('python' + requires_python)
+    except Exception:
+        return True
+
+    return any(f'{python_version}.{patch}' in requirement for patch in (0, 99))
@@ -1,12 +1,17 @@
 #!/usr/bin/env python
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
 import os
 import platform
 import re
 import shutil
 import subprocess
 import sys
+import threading
+import time
 
 MIN_SUPPORTED_VERSION = 3.6
 IS_DEBIAN = platform.system() == 'Linux' and os.path.exists('/etc/debian_version')
@@ -14,14 +19,20 @@ IS_OLD_UBUNTU = (IS_DEBIAN and os.path.exists('/etc/lsb-release')
                  and re.search('RELEASE=1[46]', open('/etc/lsb-release').read()))
 IS_MACOS = platform.system() == 'Darwin'
 SUDO = 'sudo ' if os.getuid() else ''
+CACHE_FILE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'autopip',
+                          'check-python.json')
+CACHE_TTL = 86400
 
 parser = argparse.ArgumentParser(description='Check and fix Python installation')
 parser.add_argument('--autofix', action='store_true', help='Automatically fix any problems found')
 parser.add_argument('--version', default='3', help='Python version to check. autopip requires Python 3.6+. E.g. 3.11')
+parser.add_argument('--json', action='store_true', help='Print a JSON report of all checks for provisioning tools')
+parser.add_argument('--no-cache', action='store_true', help='Re-run checks that passed recently for the same Python')
 args = parser.parse_args()
 
 PY_VERSION = args.version
 AUTOFIX = args.autofix
+JSON = args.json
 
 
 def check_sudo():
@@ -235,6 +246,122 @@ class AutoFixSuggestion(Exception):
         self.cmd = cmd
 
 
+class ThreadOutput:
+    """ Sends output of each check to its own buffer so checks can run concurrently without mixing their output """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, msg):
+        return (getattr(self.local, 'buffer', None) or self.stream).write(msg)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return self.stream.isatty()
+
+
+def load_cache():
+    if args.no_cache:
+        return {}
+
+    try:
+        with open(CACHE_FILE) as fp:
+            cache = json.load(fp)
+        return {key: checked for key, checked in cache.items() if time.time() - checked < CACHE_TTL}
+
+    except Exception:
+        return {}
+
+
+def save_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        tmp_file = '{}.{}'.format(CACHE_FILE, os.getpid())
+        with open(tmp_file, 'w') as fp:
+            json.dump(cache, fp)
+        os.replace(tmp_file, CACHE_FILE)
+
+    except Exception:
+        pass  # Caching is only an optimization
+
+
+def cache_key(check):
+    """ Key to cache a passing check by path and mtime of the interpreter (and pip), or None if not found. """
+    paths = [shutil.which('python' + PY_VERSION)]
+    if check is check_pip:
+        paths.append(shutil.which('pip3'))
+
+    if not all(paths):
+        return None
+
+    return check.__name__ + ':' + ':'.join('{}@{}'.format(os.path.realpath(p), os.stat(p).st_mtime) for p in paths)
+
+
+def run_check(check, cache):
+    """ Run the check with its output captured and return the result as a dict """
+    result = {'name': check.__name__.split('_', 1)[1].replace('_', ' '), 'status': 'ok', 'cached': False,
+              'seconds': 0, 'output': '', 'suggestion': None, 'fix': None}
+    key = cache_key(check)
+
+    if key in cache:
+        result['cached'] = True
+        return result
+
+    sys.stdout.local.buffer = io.StringIO()
+    start_time = time.time()
+
+    try:
+        check()
+
+    except AutoFixSuggestion as e:
+        result.update(status='fix', suggestion=str(e), fix=list(e.cmd if isinstance(e.cmd, tuple) else (e.cmd,)))
+
+    except SystemExit:
+        result['status'] = 'failed'
+
+    except Exception as e:
+        error('!', str(e))
+        result['status'] = 'failed'
+
+    finally:
+        result['output'] = sys.stdout.local.buffer.getvalue()
+        result['seconds'] = round(time.time() - start_time, 3)
+        sys.stdout.local.buffer = None
+
+    if result['status'] == 'ok' and key:
+        cache[key] = time.time()
+
+    return result
+
+
+def print_result(result):
+    if JSON:
+        return
+
+    print('Checking ' + result['name'] + (' (passed recently)' if result['cached'] else ''))
+    sys.stdout.write(result['output'])
+
+    if result['status'] == 'fix' and not AUTOFIX:
+        print('  ' + result['suggestion'] + ': ' + ' && '.join(result['fix']) + '\n')
+        print('# Run the above suggested command(s) manually and then re-run to continue checking,')
+        print('  or re-run using "python - --autofix" to run all suggested commands automatically.')
+
+    elif result['status'] == 'ok':
+        print('')
+
+
+def print_report(results, ok):
+    if JSON:
+        print(json.dumps({'python_version': PY_VERSION, 'python_path': shutil.which('python' + PY_VERSION),
+                          'ok': ok, 'checks': results}, indent=2))
+
+    elif ok:
+        echo('Python is alive and well. You are ready to use autopip!', color='green')
+
+
 checks = [check_python, check_pip, check_venv, check_setuptools, check_wheel, check_python_dev]
 
 if AUTOFIX:
@@ -244,43 +371,60 @@ if AUTOFIX:
     if SUDO:
         checks.insert(0, check_sudo)
 
-try:
-    last_fix = None
+sys.stdout = ThreadOutput(sys.stdout)
+cache = load_cache()
+results = []
 
-    for check in checks:
-        print('Checking ' + check.__name__.split('_', 1)[1].replace('_', ' '))
+try:
+    if AUTOFIX:  # Fixes change the system, so check one at a time
+        last_fix = None
 
-        while True:
-            try:
-                check()
-                break
+        for check in checks:
+            while True:
+                result = run_check(check, cache)
+                print_result(result)
 
-            except AutoFixSuggestion as e:
-                cmds = e.cmd if isinstance(e.cmd, tuple) else (e.cmd,)
-                if AUTOFIX:
-                    if cmds == last_fix:
+                if result['status'] == 'fix':
+                    if result['fix'] == last_fix:
                         error('! Failed to fix automatically, so you gotta fix it yourself.')
-                        sys.exit(1)
+                        result['status'] = 'failed'
 
                     else:
-                        for cmd in cmds:
+                        for cmd in result['fix']:
                             run(cmd, return_output=True, raises=True)
 
-                        last_fix = cmds
+                        last_fix = result['fix']
+                        continue
 
-                else:
-                    print('  ' + str(e) + ': ' + ' && '.join(cmds) + '\n')
-                    print('# Run the above suggested command(s) manually and then re-run to continue checking,')
-                    print('  or re-run using "python - --autofix" to run all suggested commands automatically.')
-                    sys.exit(1)
+                break
 
-        print('')
+            results.append(result)
+            if result['status'] != 'ok':
+                break
+
+    else:  # Checks are independent, so run them concurrently and then show results in order
+        with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+            for result in executor.map(lambda c: run_check(c, cache), checks):
+                results.append(result)
+
+        for result in results:
+            print_result(result)
+            if result['status'] != 'ok' and not JSON:
+                break
 
 except Exception as e:
     error('!', str(e))
-    sys.exit(1)
+    results.append({'name': 'autofix', 'status': 'failed', 'cached': False, 'seconds': 0, 'output': str(e),
+                    'suggestion': None, 'fix': None})
 
 except KeyboardInterrupt:
     sys.exit(1)
 
-echo('Python is alive and well. You are ready to use autopip!', color='green')
+finally:
+    save_cache(cache)
+
+passed = len(results) == len(checks) and all(r['status'] == 'ok' for r in results)
+print_report(results, passed)
+
+if not passed:
+    sys.exit(1)
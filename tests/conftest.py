@@ -3,10 +3,12 @@ import os
 from pathlib import Path
 import re
 
-from mock import Mock, MagicMock
+from mock import DEFAULT, Mock, MagicMock
 import pytest
 
 from autopip import main
+from autopip.backends import InstallerBackend
+from autopip.utils import assert_spawn_budget, record_spawn, reset_spawns
 
 logging.basicConfig(format='%(message)s', stream=open(os.devnull, 'w'), level=logging.INFO)
 
@@ -35,7 +37,11 @@ def mock_paths(monkeypatch, tmpdir):
 
 @pytest.fixture(autouse=True)
 def mock_run(monkeypatch):
-    r = MagicMock(return_value='0 * * * * * /bin/autopip update')
+    def spawn(cmd, *args, **kwargs):
+        record_spawn(cmd, 0)  # Count mocked processes against spawn budgets
+        return DEFAULT
+
+    r = MagicMock(return_value='0 * * * * * /bin/autopip update', side_effect=spawn)
     monkeypatch.setattr('autopip.crontab.run', r)
     monkeypatch.setattr('autopip.crontab.IS_MACOS', False)   # Consistent test behavior on Ubuntu and macOS
     return r
@@ -64,3 +70,61 @@ def autopip(monkeypatch, caplog):
             return tmp_re.sub('/tmp/system/', caplog.text)
 
     return _run
+
+
+@pytest.fixture()
+def spawn_budget():
+    """
+    Assert number of processes started via autopip.utils.run (including mocked ones) by command class since the start
+    of the test or the last check, e.g. spawn_budget({'pip install': 1, 'crontab': 2}, total=5)
+    """
+    reset_spawns()
+
+    def _check(budget, total=None):
+        try:
+            assert_spawn_budget(budget, total=total)
+        finally:
+            reset_spawns()
+
+    return _check
+
+
+class FakeBackend(InstallerBackend):
+    """ Installer backend that creates an empty virtual environment with a script for each installed requirement """
+
+    name = 'fake'
+
+    #: List of (method, path, args) tuples for calls to all instances
+    calls = []
+
+    def create_env(self, path, python_version):
+        self.calls.append(('create_env', path, python_version))
+        (path / 'bin').mkdir(parents=True)
+
+    def install(self, path, requirements, no_compile=False, report_file=None):
+        self.calls.append(('install', path, requirements))
+        for requirement in requirements:
+            script = path / 'bin' / requirement.split('==')[0]
+            script.write_text(f'#!/bin/sh\necho {requirement}\n')
+            script.chmod(0o755)
+
+    def install_locked(self, path, lock_file, no_compile=False):
+        self.calls.append(('install_locked', path, lock_file))
+        self.install(path, [lock_file.read_text().split('\n')[1]])
+
+    def list_installed(self, path):
+        return {s.name: s.read_text().split('==')[1].strip() for s in (path / 'bin').iterdir()}
+
+    def remove_tool(self, path, tool):
+        self.calls.append(('remove_tool', path, tool))
+
+
+@pytest.fixture()
+def fake_backend(monkeypatch):
+    """ Register and select the fake installer backend, and report scripts based on what it installed """
+    monkeypatch.setattr('autopip.backends.BACKENDS', {'fake': FakeBackend})
+    monkeypatch.setenv('AUTOPIP_BACKEND', 'fake')
+    monkeypatch.setattr('autopip.manager.App._pkg_info', lambda self, path=None: {
+        'scripts': [s.name for s in ((path or self.current_path) / 'bin').iterdir()], 'group_specs': []})
+    FakeBackend.calls = []
+    return FakeBackend
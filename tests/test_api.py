@@ -0,0 +1,35 @@
+from autopip.api import Autopip
+
+
+def test_api(fake_backend, monkeypatch):
+    versions = ['0.1.12']
+    monkeypatch.setattr('autopip.manager.AppsManager._app_versions', lambda self, name, **kwargs: versions)
+    api = Autopip()
+
+    result, = api.install(['bumper'], update='daily')
+    assert result.ok
+    assert (result.app, result.action, result.old_version, result.new_version) == ('bumper', 'install', None, '0.1.12')
+    assert result.scripts_added == ['bumper']
+    assert [a['version'] for a in api.list()] == ['0.1.12']
+
+    versions.append('0.1.13')
+    result, = api.update()
+    assert (result.action, result.old_version, result.new_version) == ('upgrade', '0.1.12', '0.1.13')
+    assert not result.scripts_added
+
+    result, = api.update()
+    assert result.action == 'none'
+
+    result = api.rollback('bumper')
+    assert (result.action, result.new_version) == ('rollback', '0.1.12')
+
+    result, = api.install(['tool'], python_version='0.1')
+    assert not result.ok
+    assert result.error == 'python0.1 does not exist. Please install it first, or ensure its path is in PATH.'
+
+    result = api.rollback('tool')
+    assert result.to_dict()['error'] == 'tool is not installed'
+
+    result, = api.uninstall(['bumper'])
+    assert (result.action, result.scripts_removed) == ('uninstall', ['bumper'])
+    assert api.list() == []
@@ -97,6 +97,22 @@ Scripts are in /tmp/system/bin: bump
     assert autopip('list') == 'No apps are installed yet.\n'
 
 
+def test_autopip_spawn_budget(monkeypatch, autopip, mock_run, spawn_budget):
+    monkeypatch.setattr('autopip.crontab.randint', Mock(return_value=10))
+
+    # Install latest
+    autopip('install bumper --update hourly')
+    spawn_budget({'python -m venv': 1, 'pip install': 2, 'python inspect_app.py': 1}, total=11)
+
+    # Already installed
+    autopip('install bumper --update hourly')
+    spawn_budget({'python -m venv': 0, 'pip install': 0, 'python inspect_app.py': 1}, total=7)
+
+    # Update via cron when not due
+    autopip('update', isatty=False)
+    spawn_budget({}, total=0)
+
+
 def test_update(autopip):
     assert autopip('update') == 'No apps installed yet.\n'
 
@@ -129,7 +145,7 @@ def test_install_nonexisting(autopip):
 
 def test_install_failed(autopip, monkeypatch, mock_run):
     mock_run.side_effect = Exception('install failed')
-    monkeypatch.setattr('autopip.manager.run', mock_run)
+    monkeypatch.setattr('autopip.backends.run', mock_run)
     stdout, _ = autopip('install utils-core', raises=SystemExit)
     assert '! install failed' in stdout
 
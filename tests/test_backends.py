@@ -0,0 +1,51 @@
+import pytest
+
+from autopip.backends import get_backend, PipBackend
+from autopip.constants import PYTHON_VERSION
+from autopip.exceptions import MissingError
+from autopip.manager import App, AppsPath
+
+
+def test_get_backend(monkeypatch):
+    monkeypatch.delenv('AUTOPIP_BACKEND', raising=False)
+    assert isinstance(get_backend(), PipBackend)
+
+    monkeypatch.setenv('AUTOPIP_BACKEND', 'blah')
+    with pytest.raises(ValueError):
+        get_backend()
+
+    monkeypatch.setattr('autopip.backends.shutil.which', lambda name: None)
+    with pytest.raises(MissingError):
+        get_backend('uv')
+    assert isinstance(get_backend('auto'), PipBackend)
+
+
+def test_install_with_fake_backend(fake_backend, mock_paths):
+    system_root, _, _ = mock_paths
+
+    app = App('bumper', AppsPath())
+    app.install('0.1.13', 'bumper')
+
+    version_path = system_root / 'bumper' / '0.1.13'
+    assert fake_backend.calls == [
+        ('create_env', version_path, PYTHON_VERSION),
+        ('install', version_path, ['bumper==0.1.13']),
+        ('remove_tool', version_path, 'pip'),
+    ]
+    assert (system_root / 'bin' / 'bumper').resolve() == version_path / 'bin' / 'bumper'
+    assert app.settings()['app_spec'] == 'bumper'
+    assert app.settings()['python_version'] == PYTHON_VERSION
+
+
+def test_pip_create_env_in_venv(monkeypatch):
+    monkeypatch.setattr('autopip.backends.sys.prefix', '/opt/apps/autopip/1.0')
+    monkeypatch.setattr('autopip.backends.sys.base_prefix', '/usr')
+    monkeypatch.setattr('autopip.backends.sys.version_info', (3, 8, 18))
+    assert not PipBackend._env_builder_uses_base_python()
+
+    monkeypatch.setattr('autopip.backends.sys.version_info', (3, 11, 7))
+    assert PipBackend._env_builder_uses_base_python()
+
+    monkeypatch.setattr('autopip.backends.sys.prefix', '/usr')
+    monkeypatch.setattr('autopip.backends.sys.version_info', (3, 8, 18))
+    assert PipBackend._env_builder_uses_base_python()
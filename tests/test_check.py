@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 import subprocess
 
@@ -15,3 +16,18 @@ def test_check(python):
         cmd.extend(['--version', PYTHON_VERSION])
 
     subprocess.check_call(cmd)
+
+
+def test_check_json(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    check_script = str(Path(__file__).parent.parent / 'etc' / 'check-python.py')
+    cmd = ['python3', check_script, '--version', PYTHON_VERSION, '--json']
+
+    report = json.loads(subprocess.run(cmd, stdout=subprocess.PIPE).stdout)
+    assert report['python_version'] == PYTHON_VERSION
+    assert [c['name'] for c in report['checks']] == ['python', 'pip', 'venv', 'setuptools', 'wheel', 'python dev']
+    assert not any(c['cached'] for c in report['checks'])
+
+    passed = [c['name'] for c in report['checks'] if c['status'] == 'ok']
+    report = json.loads(subprocess.run(cmd, stdout=subprocess.PIPE).stdout)
+    assert [c['name'] for c in report['checks'] if c['cached']] == passed
@@ -0,0 +1,32 @@
+from pathlib import Path
+import shutil
+
+from autopip.dedupe import dedupe, collect_garbage
+
+
+def test_dedupe(tmpdir):
+    store_root = Path(tmpdir) / '.store'
+    version_paths = []
+
+    for version in ['1.0.0', '1.0.1']:
+        site_packages = Path(tmpdir) / 'app' / version / 'lib' / 'python3.6' / 'site-packages'
+        site_packages.mkdir(parents=True)
+        (site_packages / 'requests.py').write_text('import urllib3')
+        (site_packages / 'app.py').write_text(f'VERSION = "{version}"')
+        version_paths.append(site_packages.parent.parent.parent)
+
+    assert dedupe(version_paths, store_root) == (1, 14)
+    assert dedupe(version_paths, store_root) == (0, 0)
+
+    old_requests = version_paths[0] / 'lib' / 'python3.6' / 'site-packages' / 'requests.py'
+    new_requests = version_paths[1] / 'lib' / 'python3.6' / 'site-packages' / 'requests.py'
+    assert old_requests.stat().st_ino == new_requests.stat().st_ino
+    assert old_requests.stat().st_nlink == 3
+
+    shutil.rmtree(version_paths[0])
+    assert new_requests.read_text() == 'import urllib3'
+    assert collect_garbage(store_root) == 1  # Only app.py from the removed version
+
+    shutil.rmtree(version_paths[1])
+    assert collect_garbage(store_root) == 2
+    assert collect_garbage(store_root) == 0
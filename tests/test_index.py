@@ -0,0 +1,150 @@
+from io import BytesIO
+import threading
+from pathlib import Path
+from unittest.mock import Mock
+import urllib.error
+
+import pytest
+
+from autopip.index import iter_lines, IndexClient, IndexGroup, IndexUnavailable
+
+INDEX_URL = 'https://pypi.org/simple/'
+
+
+def test_read_retries(monkeypatch, tmpdir):
+    sleep = Mock()
+    monkeypatch.setattr('autopip.index.sleep', sleep)
+    state_file = Path(tmpdir) / '.state' / 'index.json'
+
+    client = IndexClient(INDEX_URL, state_file=state_file)
+    client._opener = Mock()
+    unavailable = urllib.error.HTTPError(INDEX_URL, 503, 'Unavailable', {'Retry-After': '5'}, None)
+    client._opener.open.side_effect = [urllib.error.URLError('timed out'), unavailable,
+                                       BytesIO(b'bumper-0.1.13.tar.gz')]
+
+    assert client.read(INDEX_URL + 'bumper/') == 'bumper-0.1.13.tar.gz'
+    assert client._opener.open.call_count == 3
+    waits = [c[0][0] for c in sleep.call_args_list]
+    assert 5 in waits  # From Retry-After
+    assert all(0 <= w <= IndexClient.MAX_BACKOFF_SECONDS for w in waits)
+
+    client._opener.open.side_effect = urllib.error.HTTPError(INDEX_URL, 404, 'Not Found', {}, None)
+    with pytest.raises(urllib.error.HTTPError):
+        client.read(INDEX_URL + 'blah/')
+    assert client._opener.open.call_count == 4
+
+
+def test_circuit_breaker(monkeypatch, tmpdir):
+    monkeypatch.setattr('autopip.index.sleep', Mock())
+    state_file = Path(tmpdir) / '.state' / 'index.json'
+
+    client = IndexClient(INDEX_URL, state_file=state_file)
+    client._opener = Mock()
+    client._opener.open.side_effect = urllib.error.URLError('Connection refused')
+
+    for _ in range(IndexClient.FAILURE_THRESHOLD):
+        with pytest.raises(Exception, match='after 4 attempts'):
+            client.read(INDEX_URL + 'bumper/')
+    assert client._opener.open.call_count == 4 * IndexClient.FAILURE_THRESHOLD
+
+    # Skipped by the next run without reading from the index
+    client = IndexClient(INDEX_URL, state_file=state_file)
+    client._opener = Mock()
+    with pytest.raises(IndexUnavailable):
+        client.read(INDEX_URL + 'bumper/')
+    assert not client._opener.open.called
+
+    # Tries again after a while and closes the circuit when the index is back
+    monkeypatch.setattr('autopip.index.time', lambda: 2 ** 40)
+    client._opener.open.return_value = BytesIO(b'')
+    assert client.read(INDEX_URL + 'bumper/') == ''
+    assert list(client._load_state()) == ['latency']
+
+
+def test_iter_lines():
+    page = '<a href="bumper-0.1.13.tar.gz">bumper-0.1.13.tar.gz</a>\n<a href="café-1.0.tar.gz">café</a>'
+    assert list(iter_lines(BytesIO(page.encode('utf-8')), chunk_size=128)) == page.split('\n')
+    assert ''.join(iter_lines(BytesIO(page.encode('utf-8')), chunk_size=3)) == page.replace('\n', '')
+
+    page = '<a href="a-1.0.tar.gz">a</a>' * 10  # No line breaks
+    assert ''.join(iter_lines(BytesIO(page.encode('utf-8')), chunk_size=16)) == page
+    assert max(len(line) for line in iter_lines(BytesIO(page.encode('utf-8')), chunk_size=16)) < 64
+
+
+class FakeClient:
+    def __init__(self, index_url, content=None, latency=None, error=None, wait=None):
+        self.index_url = index_url
+        self.content = content
+        self.latency = latency
+        self.error = error
+        self.wait = wait
+        self.reads = []
+
+    def read(self, url, parse):
+        self.reads.append(url)
+        if self.wait:
+            self.wait.wait(5)
+        if self.error:
+            raise self.error
+        return parse(iter(self.content.split('\n')))
+
+
+def test_index_group():
+    def parse(lines):
+        return [version for line in lines for version in line.split()]
+
+    slow = threading.Event()
+    primary = FakeClient('https://primary/', '1.0 2.0', wait=slow)
+    fast_mirror = FakeClient('https://fast/', '2.0 3.0', latency=0.1)
+    slow_mirror = FakeClient('https://slow/', '4.0', latency=2)
+    group = IndexGroup([primary, slow_mirror, fast_mirror], hedge_seconds=0.05)
+
+    # Primary is slow, so the fastest mirror answers
+    assert group.lookup('bumper', parse) == ['2.0', '3.0']
+    assert fast_mirror.reads == ['https://fast/bumper/']
+    assert not slow_mirror.reads
+    slow.set()
+
+    group = IndexGroup([primary, slow_mirror, fast_mirror], merge_policy='union')
+    assert group.lookup('bumper', parse) == ['1.0', '2.0', '3.0', '4.0']
+
+    # Release info of each version is from the first index that has it
+    assert group.lookup('bumper', lambda lines: {v: line for line in lines for v in line.split()}) == {
+        '1.0': '1.0 2.0', '2.0': '1.0 2.0', '3.0': '2.0 3.0', '4.0': '4.0'}
+
+    not_found = urllib.error.HTTPError(INDEX_URL, 404, 'Not Found', {}, None)
+    primary.error = not_found
+    group = IndexGroup([primary, slow_mirror], hedge_seconds=10)
+    assert group.lookup('bumper', parse) == ['4.0']  # Next index is asked right away when primary fails
+
+    slow_mirror.error = Exception('Connection refused')
+    with pytest.raises(Exception, match='Connection refused'):
+        group.lookup('bumper', parse)
+
+    slow_mirror.error = not_found
+    with pytest.raises(urllib.error.HTTPError):
+        group.lookup('bumper', parse)
+
+    with pytest.raises(ValueError):
+        IndexGroup([primary], merge_policy='blah')
+
+
+def test_state_is_saved_only_on_changes(monkeypatch, tmpdir):
+    monkeypatch.setattr('autopip.index.sleep', Mock())
+    state_file = Path(tmpdir) / '.state' / 'index.json'
+
+    client = IndexClient(INDEX_URL, state_file=state_file)
+    client._opener = Mock()
+    client._opener.open.side_effect = lambda *args, **kwargs: BytesIO(b'')
+    client.read(INDEX_URL + 'bumper/')
+    assert client.latency is not None
+    assert not state_file.exists()
+
+    # Plan mode does not save failures
+    client = IndexClient(INDEX_URL, state_file=state_file, save_state=False)
+    client._opener = Mock()
+    client._opener.open.side_effect = urllib.error.URLError('Connection refused')
+    with pytest.raises(Exception, match='after 4 attempts'):
+        client.read(INDEX_URL + 'bumper/')
+    assert client._load_state()['failures'] == 1
+    assert not state_file.exists()
@@ -4,7 +4,8 @@ from autopip.inspect_app import gather_intel, get_scripts
 
 
 def test_gather_intel():
-    assert gather_intel('autopip') == {'group_specs': [], 'scripts': ['app', 'autopip']}
+    assert gather_intel('autopip') == {'group_specs': [], 'scripts': ['app', 'autopip'],
+                                       'entry_points': {'app': 'autopip:main', 'autopip': 'autopip:main'}}
 
 
 def test_scripts(monkeypatch):
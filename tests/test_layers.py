@@ -0,0 +1,78 @@
+from pathlib import Path
+
+from autopip.backends import InstallerBackend
+from autopip.constants import PYTHON_VERSION
+from autopip.layers import BASE_PTH_FILE, BaseLayer
+from autopip.manager import App, AppsPath, AppsManager
+
+
+class SitePackagesBackend(InstallerBackend):
+    """ Installer backend that creates a dist-info dir in site-packages for each pinned requirement """
+
+    name = 'site-packages'
+
+    def create_env(self, path, python_version):
+        (path / 'bin').mkdir(parents=True)
+        (path / 'lib' / f'python{python_version}' / 'site-packages').mkdir(parents=True)
+
+    def install(self, path, requirements, no_compile=False, report_file=None):
+        site_packages = next(path.glob('lib/python*/site-packages'))
+        for requirement in requirements:
+            name, version = requirement.split('==')
+            (site_packages / f'{name}-{version}.dist-info').mkdir()
+            if name == 'bumper':
+                (path / 'bin' / 'bumper').write_text('#!/bin/sh\n')
+
+    def list_installed(self, path):
+        site_packages = list(path.glob('lib/python*/site-packages'))
+        site_packages += [Path(p.read_text().strip()) for p in path.glob(f'lib/python*/site-packages/{BASE_PTH_FILE}')]
+        return dict(d.name[:-len('.dist-info')].split('-') for s in site_packages for d in s.glob('*.dist-info'))
+
+    def remove_tool(self, path, tool):
+        pass
+
+
+def test_base_layer():
+    paths = AppsPath()
+    layer = BaseLayer(paths, '3.11')
+    backend = SitePackagesBackend()
+
+    assert layer.build(backend, ['requests==2.31'])
+    old_layer_path = layer.current_path
+    assert layer.pins() == {'requests': '2.31'}
+    assert not layer.build(backend)  # Refresh without changes
+
+    version_path = paths.install_root / 'tool' / '1.0'
+    backend.create_env(version_path, '3.11')
+    assert layer.link(version_path) == old_layer_path
+    pth_file = next(version_path.glob(f'lib/python*/site-packages/{BASE_PTH_FILE}'))
+    assert pth_file.read_text() == str(next(old_layer_path.glob('lib/python*/site-packages'))) + '\n'
+
+    backend.install(version_path, ['requests==2.0'])
+    assert layer.shadowed(version_path, old_layer_path) == {'requests': '2.0'}
+
+    assert layer.build(backend, ['requests==2.32'])
+    assert layer.current_path != old_layer_path
+    assert layer.collect_garbage() == []  # Old layer is still used by the app
+
+    layer.unlink(version_path)
+    assert layer.collect_garbage() == [old_layer_path]
+
+
+def test_install_with_base(monkeypatch):
+    monkeypatch.setattr('autopip.manager.get_backend', lambda name=None: SitePackagesBackend())
+    monkeypatch.setattr('autopip.manager.App._pkg_info', lambda self, path=None: {
+        'scripts': ['bumper'], 'group_specs': []})
+
+    paths = AppsPath()
+    AppsManager().base(['requests==2.31'], python_version=PYTHON_VERSION)
+
+    bumper = App('bumper', paths)
+    bumper.install('0.1.13', 'bumper', python_version=PYTHON_VERSION, base=True)
+    assert bumper.settings()['base'] is True
+    assert list(Path(bumper.current_path).glob(f'lib/python*/site-packages/{BASE_PTH_FILE}'))
+    assert 'requests' not in bumper.lock_file('0.1.13').read_text()  # Inherited from the layer, so not locked
+    assert 'bumper==0.1.13' in bumper.lock_file('0.1.13').read_text()
+
+    bumper.install('0.1.12', 'bumper', python_version=PYTHON_VERSION, base=False)
+    assert not list(Path(bumper.current_path).glob(f'lib/python*/site-packages/{BASE_PTH_FILE}'))
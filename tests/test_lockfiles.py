@@ -0,0 +1,60 @@
+import json
+from pathlib import Path
+
+from autopip.constants import PYTHON_VERSION
+from autopip.lockfiles import locked_python_version, locked_version, write_lockfile
+from autopip.manager import App, AppsPath
+
+
+def test_write_lockfile(tmpdir):
+    lock_file = Path(tmpdir) / '.lockfiles' / '0.1.13.txt'
+    report_file = Path(tmpdir) / 'report.json'
+    report_file.write_text(json.dumps({'install': [
+        {'metadata': {'name': 'bumper', 'version': '0.1.13'},
+         'download_info': {'archive_info': {'hashes': {'sha256': 'abc'}}}},
+        {'metadata': {'name': 'Utils_Core', 'version': '0.1.2'},
+         'download_info': {'archive_info': {'hash': 'sha256=def'}}},
+    ]}))
+
+    write_lockfile(lock_file, 'bumper', '0.1.13', '3.11', report_file=report_file)
+    assert lock_file.read_text() == """\
+# Locked dependencies of bumper==0.1.13 for Python 3.11, generated by autopip
+bumper==0.1.13 \\
+    --hash=sha256:abc
+Utils_Core==0.1.2 \\
+    --hash=sha256:def
+"""
+    assert locked_version(lock_file, 'bumper') == '0.1.13'
+    assert locked_version(lock_file, 'utils-core') == '0.1.2'
+    assert locked_version(lock_file, 'requests') is None
+    assert locked_python_version(lock_file) == '3.11'
+
+    write_lockfile(lock_file, 'bumper', '0.1.13', '3.11', installed={'bumper': '0.1.13', 'pip': '23.0'})
+    assert lock_file.read_text() == """\
+# Locked dependencies of bumper==0.1.13 for Python 3.11, generated by autopip
+bumper==0.1.13
+"""
+
+
+def test_reinstall_from_lockfile(fake_backend):
+    app = App('bumper', AppsPath())
+    app.install('0.1.13', 'bumper')
+    assert app.lock_file('0.1.13').read_text().split('\n')[1] == 'bumper==0.1.13'
+
+    fake_backend.calls = []
+    app.build('0.1.12', PYTHON_VERSION)
+    assert [c[0] for c in fake_backend.calls] == ['create_env', 'install', 'remove_tool']
+
+    (app.path / '0.1.13').rename(app.path / '0.1.13.removed')
+    fake_backend.calls = []
+    app.build('0.1.13', PYTHON_VERSION)
+    assert [c[0] for c in fake_backend.calls] == ['create_env', 'install_locked', 'install', 'remove_tool']
+
+    # Lock file resolved for another Python version is not used
+    lock_file = app.lock_file('0.1.13')
+    lock_file.write_text(lock_file.read_text().replace(f'Python {PYTHON_VERSION}', 'Python 3.0'))
+    (app.path / '0.1.13').rename(app.path / '0.1.13.removed2')
+    fake_backend.calls = []
+    app.build('0.1.13', PYTHON_VERSION)
+    assert [c[0] for c in fake_backend.calls] == ['create_env', 'install', 'remove_tool']
+    assert locked_python_version(lock_file) == PYTHON_VERSION
@@ -0,0 +1,27 @@
+from pathlib import Path
+import threading
+
+from autopip.locks import file_lock
+
+
+def test_file_lock(tmpdir):
+    lock_file = Path(tmpdir) / '.locks' / 'bumper.lock'
+    waited = []
+
+    def lock_in_thread():
+        with file_lock(lock_file) as thread_waited:
+            waited.append(thread_waited)
+
+    with file_lock(lock_file) as outer_waited:
+        assert not outer_waited
+
+        with file_lock(lock_file) as nested_waited:  # Reentrant
+            assert not nested_waited
+
+        thread = threading.Thread(target=lock_in_thread)
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+
+    thread.join()
+    assert waited == [True]
@@ -0,0 +1,23 @@
+from autopip.profiling import PROFILE_ENV_VAR, profile_enabled
+
+
+def test_profile(autopip, mock_paths):
+    system_root, _, _ = mock_paths
+
+    stdout = autopip('--profile list')
+    assert 'Profile of list command' in stdout
+    assert 'Peak memory' in stdout
+
+    profiles = sorted(p.suffix for p in (system_root / 'log' / 'profiles').iterdir())
+    assert profiles == ['.prof', '.txt']
+
+
+def test_profile_enabled(monkeypatch):
+    assert not profile_enabled()
+    assert profile_enabled(True)
+
+    monkeypatch.setenv(PROFILE_ENV_VAR, '1')
+    assert profile_enabled()
+
+    monkeypatch.setenv(PROFILE_ENV_VAR, 'false')
+    assert not profile_enabled()
@@ -0,0 +1,29 @@
+from pathlib import Path
+import subprocess
+import sys
+
+from autopip.shims import SHIM_MARKER, SHIMS_DIR, shim_source, write_shims
+
+
+def test_shim_source():
+    source = shim_source(Path('/apps/tool/1.0/bin/python'), 'tool.cli:main.run [extra]', isolated=True)
+    assert source.startswith('#!/apps/tool/1.0/bin/python -I\n' + SHIM_MARKER)
+    assert 'from tool.cli import main\n' in source
+    assert 'sys.exit(main.run())' in source
+
+    assert shim_source(Path('python'), 'tool') is None  # Module only entry points use the script from the installer
+    assert shim_source(Path('python'), 'not an entry point') is None
+
+
+def test_write_shims(tmpdir):
+    version_path = Path(tmpdir) / 'tool' / '1.0'
+    (version_path / 'bin').mkdir(parents=True)
+    (version_path / 'bin' / 'python').symlink_to(sys.executable)
+
+    assert write_shims(version_path, {'config': 'sysconfig:_main', 'bad': '???', 'module': 'sysconfig'},
+                       isolated=True) == {'config'}
+    shim = version_path / SHIMS_DIR / 'config'
+    assert 'Platform: ' in subprocess.check_output([str(shim)]).decode('utf-8')
+
+    assert write_shims(version_path, {}) == set()
+    assert not shim.exists()
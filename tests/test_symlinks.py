@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from autopip.symlinks import apply_links, plan_links, scan_links
+
+
+def test_plan_and_apply_links(tmpdir):
+    install_root = Path(tmpdir) / 'apps'
+    symlink_root = Path(tmpdir) / 'bin'
+    other_root = Path(tmpdir) / 'other'
+    for path in [install_root / 'bumper' / 'bin', symlink_root, other_root]:
+        path.mkdir(parents=True)
+    for script in ['bumper', 'bump', 'old']:
+        (install_root / 'bumper' / 'bin' / script).touch()
+    (other_root / 'tool').touch()
+
+    (symlink_root / 'bump').symlink_to(install_root / 'bumper' / 'bin' / 'old')
+    (symlink_root / 'old').symlink_to(install_root / 'bumper' / 'bin' / 'old')
+    (symlink_root / 'gone').symlink_to(install_root / 'gone' / 'bin' / 'gone')
+    (symlink_root / 'atomic_symlink_for_bumper').symlink_to(install_root / 'bumper' / 'bin' / 'bumper')
+    (symlink_root / 'tool').symlink_to(other_root / 'tool')
+    (symlink_root / 'other').symlink_to(other_root / 'other')
+    (symlink_root / 'file').touch()
+
+    desired = {name: install_root / 'bumper' / 'bin' / name for name in ['bumper', 'bump', 'tool', 'file']}
+    changes = plan_links(scan_links(symlink_root), desired, install_root)
+    assert [(c.action, c.name) for c in changes] == [
+        ('remove', 'atomic_symlink_for_bumper'),
+        ('update', 'bump'),
+        ('create', 'bumper'),
+        ('conflict', 'file'),
+        ('remove', 'gone'),
+        ('remove', 'old'),
+        ('conflict', 'tool'),
+    ]
+
+    apply_links(symlink_root, changes)
+    assert sorted(p.name for p in symlink_root.iterdir()) == ['bump', 'bumper', 'file', 'other', 'tool']
+    assert (symlink_root / 'bump').resolve() == install_root / 'bumper' / 'bin' / 'bump'
+    assert (symlink_root / 'tool').resolve() == other_root / 'tool'
+
+    changes = plan_links(scan_links(symlink_root), desired, install_root, takeover={'tool'})
+    assert [(c.action, c.name) for c in changes] == [('conflict', 'file'), ('update', 'tool')]
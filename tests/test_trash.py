@@ -0,0 +1,47 @@
+import fcntl
+from pathlib import Path
+
+from autopip.trash import has_trash, reap, reap_in_background, trash
+
+
+def test_trash_and_reap(tmpdir):
+    trash_root = Path(tmpdir) / '.trash'
+    assert not has_trash(trash_root)
+    assert reap(trash_root) == 0
+
+    app_path = Path(tmpdir) / 'app'
+    (app_path / '0.1' / 'bin').mkdir(parents=True)
+    (app_path / '0.1' / 'bin' / 'app').write_text('#!/usr/bin/env python')
+
+    trash_path = trash(app_path, trash_root)
+    assert not app_path.exists()
+    assert trash_path.parent == trash_root
+    assert (trash_path / '0.1' / 'bin' / 'app').exists()
+    assert has_trash(trash_root)
+
+    # Only one process reaps at a time
+    with open(trash_root / '.reap.lock', 'a') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        assert reap(trash_root) is None
+        assert trash_path.exists()
+
+    assert reap(trash_root) == 1
+    assert not has_trash(trash_root)
+
+
+def test_reap_in_background(tmpdir):
+    trash_root = Path(tmpdir) / '.trash'
+    for name in ['a', 'b']:
+        (Path(tmpdir) / name / '0.1').mkdir(parents=True)
+        trash(Path(tmpdir) / name, trash_root)
+
+    process = reap_in_background(trash_root)
+    assert process.wait(timeout=60) == 0
+    assert not has_trash(trash_root)
+
+    # Unused store files are removed even if there was no trash, such as after a reaper was killed
+    store_file = Path(tmpdir) / '.store' / 'ab' / 'abcd'
+    store_file.parent.mkdir(parents=True)
+    store_file.write_text('unused')
+    assert reap_in_background(trash_root, store_file.parent.parent).wait(timeout=60) == 0
+    assert not store_file.exists()
@@ -0,0 +1,86 @@
+from datetime import datetime
+import os
+from pathlib import Path
+from subprocess import CalledProcessError
+
+from mock import Mock
+import pytest
+
+from autopip.utils import (assert_spawn_budget, child_env, command_class, find_cycles, in_time_window, low_priority,
+                           low_priority_cmd, reset_spawns, run, sorted_versions, spawn_summary, supports_python)
+
+
+def test_sorted_versions():
+    assert sorted_versions(['0.1.10', '0.1.9', '1.0.0']) == ['0.1.9', '0.1.10', '1.0.0']
+
+
+def test_in_time_window():
+    assert in_time_window('02:00-04:30', now=datetime(2020, 1, 1, 3, 0))
+    assert not in_time_window('02:00-04:30', now=datetime(2020, 1, 1, 4, 30))
+    assert in_time_window('22:00-02:00', now=datetime(2020, 1, 1, 23, 0))
+    assert in_time_window('22:00-02:00', now=datetime(2020, 1, 1, 1, 0))
+    assert not in_time_window('22:00-02:00', now=datetime(2020, 1, 1, 12, 0))
+
+
+def test_find_cycles():
+    assert find_cycles({'a': ['b'], 'b': ['c'], 'c': []}) == []
+    assert find_cycles({'a': ['b'], 'b': ['a'], 'c': ['c']}) == [['a', 'b', 'a'], ['c', 'c']]
+
+
+def test_supports_python():
+    assert supports_python('', '3.11')
+    assert supports_python('>=3.6, <4', '3.11')
+    assert supports_python('==3.11.*', '3.11')
+    assert supports_python('invalid', '3.11')
+    assert not supports_python('>=3.12', '3.11')
+    assert not supports_python('<3.11', '3.11')
+
+
+def test_spawn_accounting():
+    reset_spawns()
+    run(['true'])
+    with pytest.raises(CalledProcessError):
+        run('set -e\n  false | cat; false', shell=True, executable='/bin/bash')
+
+    summary = spawn_summary()
+    assert summary['true']['count'] == 1
+    assert summary['false']['failures'] == 1
+    assert command_class(['/apps/x/bin/python3.11', '-m', 'venv', '/x']) == 'python -m venv'
+    assert command_class('set -e\n  source bin/activate\n  pip install bumper') == 'pip install'
+
+    assert_spawn_budget({'true': 1}, total=2)
+    with pytest.raises(AssertionError, match='true: 1 > 0, total: 2 > 1'):
+        assert_spawn_budget({'true': 0}, total=1)
+
+
+def test_child_env(monkeypatch, tmpdir):
+    old_venv = Path(tmpdir) / 'old-venv'
+    (old_venv / 'bin').mkdir(parents=True)
+    monkeypatch.setenv('VIRTUAL_ENV', str(old_venv))
+    monkeypatch.setenv('PYTHONPATH', '/tmp')
+    monkeypatch.setenv('PATH', f'{old_venv}/bin:/usr/bin')
+
+    env = child_env(Path('/apps/bumper/0.1.13'))
+    assert env['VIRTUAL_ENV'] == '/apps/bumper/0.1.13'
+    assert env['PATH'] == '/apps/bumper/0.1.13/bin:/usr/bin'
+    assert 'PYTHONPATH' not in env
+    assert os.environ['VIRTUAL_ENV'] == str(old_venv)
+
+    assert 'VIRTUAL_ENV' not in child_env()
+    assert command_class(['/apps/bumper/0.1.13/bin/python', '-m', 'pip', 'install', 'bumper']) == 'pip install'
+
+
+def test_low_priority(monkeypatch):
+    monkeypatch.setattr('autopip.utils.shutil.which', lambda cmd: f'/usr/bin/{cmd}')
+    assert low_priority_cmd(['pip', 'install']) == ['nice', '-n', '10', 'ionice', '-c', '3', 'pip', 'install']
+    assert low_priority_cmd('cd x; make', shell=True) == "nice -n 10 ionice -c 3 sh -c 'cd x; make'"
+
+    mock_check_output = Mock(return_value=b'')
+    monkeypatch.setattr('autopip.utils.check_output', mock_check_output)
+    run(['true'])
+    with low_priority():
+        run(['true'])
+    run(['true'])
+
+    assert [c[0][0] for c in mock_check_output.call_args_list] == [
+        ['true'], ['nice', '-n', '10', 'ionice', '-c', '3', 'true'], ['true']]